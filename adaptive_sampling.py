@@ -0,0 +1,145 @@
+'''
+Adaptive stratified sampling of the area of the mandelbrot set. The domain is divided into strata, every stratum gets
+a pilot batch of samples and the rest of the budget is divided over the strata in proportion to their estimated
+standard deviation (Neyman allocation). Strata that are completely inside or outside the set get few samples, strata on
+the boundary get most of them. Running this script prints an efficiency report that compares the method with random
+and latin hypercube sampling.
+'''
+
+import time
+import numpy as np
+from functions import escape_counts, setup_grid
+from sampling_methods import random_sampling, lhc_sampling
+
+
+
+def _sample_strata(strata, amounts, xmin, ymin, width, height, columns, rng):
+    '''
+    returns amounts[i] uniform samples in stratum strata[i], strata are numbered row by row
+    '''
+    strata = np.repeat(strata, amounts)
+    complex_values = np.empty(strata.size, dtype=complex)
+    complex_values.real = xmin + width * (strata % columns + rng.random(strata.size))
+    complex_values.imag = ymin + height * (strata // columns + rng.random(strata.size))
+
+    return strata, complex_values
+
+
+
+def neyman_allocation(budget, deviations):
+    '''
+    divides budget samples over the strata in proportion to their standard deviations, rounded with the largest
+    remainders so the total is exactly budget
+    '''
+    deviations = np.asarray(deviations, dtype=float)
+    if budget <= 0:
+        return np.zeros(deviations.size, dtype=int)
+
+    weights = deviations / deviations.sum() if deviations.sum() > 0 else np.full(deviations.size, 1 / deviations.size)
+    exact = budget * weights
+    amounts = np.floor(exact).astype(int)
+
+    # give the samples left after rounding down to the largest remainders
+    remainders = exact - amounts
+    amounts[np.argsort(-remainders)[:budget - amounts.sum()]] += 1
+
+    return amounts
+
+
+
+def stratified_area(grid, max_iter, samples, strata = (16, 16), pilot = 0.2, rng = None, shortcuts = True):
+    '''
+    Estimates the area of the mandelbrot set with samples points. grid is the tuple of setup_grid, strata the amount
+    of strata along the x and y axis and pilot the fraction of the samples used for the pilot batches. Returns the
+    area, its standard error and the amount of samples per stratum.
+    '''
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+    rng = np.random.default_rng(rng)
+
+    columns, rows = strata
+    amount = columns * rows
+    width = xrange / columns
+    height = yrange / rows
+    stratum_area = width * height
+
+    pilot_size = max(2, int(pilot * samples / amount))
+    if pilot_size * amount > samples:
+        raise ValueError(f"{samples} samples are too few for {amount} strata with a pilot of {pilot_size} samples each")
+
+    # pilot batch in every stratum
+    labels, complex_values = _sample_strata(np.arange(amount), np.full(amount, pilot_size), xmin, ymin, width, height,
+                                            columns, rng)
+    inside = escape_counts(complex_values, max_iter, shortcuts) == max_iter
+    hits = np.bincount(labels, weights=inside, minlength=amount)
+    counts = np.full(amount, pilot_size)
+
+    # divide the rest of the budget by the estimated standard deviations. The estimate of the fraction is pulled a bit
+    # away from 0 and 1, so strata where the pilot only found one kind of point still get some samples
+    smoothed = (hits + 0.5) / (counts + 1)
+    extra = neyman_allocation(samples - pilot_size * amount, np.sqrt(smoothed * (1 - smoothed)))
+
+    labels, complex_values = _sample_strata(np.arange(amount), extra, xmin, ymin, width, height, columns, rng)
+    inside = escape_counts(complex_values, max_iter, shortcuts) == max_iter
+    hits += np.bincount(labels, weights=inside, minlength=amount)
+    counts += extra
+
+    # stratified estimate and its variance
+    fractions = hits / counts
+    area = stratum_area * fractions.sum()
+    variance = (stratum_area ** 2 * fractions * (1 - fractions) / (counts - 1)).sum()
+
+    return area, np.sqrt(variance), counts
+
+
+
+def _plain_area(complex_values, max_iter, total_area):
+    '''
+    area estimate of uniformly spread samples
+    '''
+    return total_area * np.mean(escape_counts(complex_values, max_iter, shortcuts=True) == max_iter)
+
+
+
+def efficiency_report(cmin, cmax, max_iter, samples, replicates, seed = None, strata = (16, 16)):
+    '''
+    Runs replicates area estimates with samples points for random, latin hypercube and adaptive stratified sampling
+    and prints the mean, the standard error over the replicates, the cpu time per estimate and the efficiency
+    1 / (variance * cpu time), higher is better. Returns the results per method.
+    '''
+    grid = setup_grid(cmin, cmax, samples)
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+    total_area = xrange * yrange
+
+    estimators = {
+        'random': lambda rng: _plain_area(random_sampling(xmin, ymin, xrange, yrange, samples, rng), max_iter, total_area),
+        'lhc': lambda rng: _plain_area(lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng),
+                                       max_iter, total_area),
+        'stratified': lambda rng: stratified_area(grid, max_iter, samples, strata, rng=rng)[0],
+    }
+
+    results = {}
+    seeds = np.random.SeedSequence(seed).spawn(len(estimators))
+
+    for (method, estimator), method_seed in zip(estimators.items(), seeds):
+        rngs = [np.random.default_rng(s) for s in method_seed.spawn(replicates)]
+
+        start = time.process_time()
+        areas = np.array([estimator(rng) for rng in rngs])
+        cpu_time = (time.process_time() - start) / replicates
+
+        error = areas.std(ddof=1)
+        results[method] = {'mean': areas.mean(), 'stderr': error, 'cpu_time': cpu_time,
+                           'efficiency': 1 / (error ** 2 * cpu_time)}
+
+    print(f"{samples} samples, {max_iter} iterations, {replicates} replicates")
+    print(f"{'method':<12}{'mean':>10}{'std error':>12}{'cpu s':>10}{'efficiency':>14}")
+    for method, result in results.items():
+        print(f"{method:<12}{result['mean']:>10.5f}{result['stderr']:>12.5f}{result['cpu_time']:>10.4f}"
+              f"{result['efficiency']:>14.4g}")
+
+    return results
+
+
+
+if __name__ == '__main__':
+    efficiency_report(-2-1.3j, 0.6+1.3j, max_iter=200, samples=10 ** 5, replicates=30, seed=42)
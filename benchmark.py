@@ -0,0 +1,228 @@
+'''
+Benchmarks the throughput of the kernel, the samplers, the area pipeline, rendering and result I/O. Results are written
+as json together with information about the machine, and can be compared against an earlier result (the baseline):
+a case that became more than threshold slower counts as a regression and makes the script exit with status 1.
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --baseline benchmark.json --threshold 0.2
+'''
+
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import scipy
+from functions import mandelbrot, compute_areas, set_colors, setup_grid
+from sampling_methods import SAMPLING_METHODS, draw_samples, linear_sampling
+from result_store import save_results, load_results
+
+
+
+def best_time(function, repeats):
+    '''
+    returns the shortest wall clock time of repeats calls of function
+    '''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+
+def kernel_cases(quick):
+    '''
+    points per second of the scalar mandelbrot() and of compute_areas for several max_iter
+    '''
+    cmin, cmax = -2-1.3j, 0.6+1.3j
+    grid = setup_grid(cmin, cmax, 100)
+    total_area = grid[4] * grid[5]
+    points = 10 ** 3 if quick else 10 ** 4
+    complex_values = draw_samples('random', grid, points, np.random.default_rng(0))
+
+    for max_iter in (50, 100, 500):
+        yield (f'mandelbrot/max_iter={max_iter}', points, 'points',
+               lambda max_iter=max_iter: [mandelbrot(c, max_iter) for c in complex_values])
+
+    points = 10 ** 5 if quick else 10 ** 6
+    complex_values = draw_samples('random', grid, points, np.random.default_rng(0))
+
+    for max_iter in (50, 100, 500):
+        yield (f'compute_areas/max_iter={max_iter}', points, 'points',
+               lambda max_iter=max_iter: compute_areas(complex_values, max_iter, total_area, checkpoints=[points]))
+        yield (f'compute_areas_shortcuts/max_iter={max_iter}', points, 'points',
+               lambda max_iter=max_iter: compute_areas(complex_values, max_iter, total_area, shortcuts=True, 
+                                                       checkpoints=[points]))
+
+
+
+def mixed_precision_cases(quick):
+    '''
+    points per second of compute_areas with the mixed precision kernel, not run by default since it does not pay off 
+    yet; compare it with compute_areas_shortcuts of the kernel group
+    '''
+    grid = setup_grid(-2-1.3j, 0.6+1.3j, 100)
+    total_area = grid[4] * grid[5]
+    points = 10 ** 5 if quick else 10 ** 6
+    complex_values = draw_samples('random', grid, points, np.random.default_rng(0))
+
+    for max_iter in (50, 100, 500):
+        yield (f'compute_areas_mixed/max_iter={max_iter}', points, 'points',
+               lambda max_iter=max_iter: compute_areas(complex_values, max_iter, total_area, shortcuts=True, 
+                                                       checkpoints=[points], precision='mixed'))
+
+
+
+def sampler_cases(quick):
+    '''
+    samples per second of every sampling method for 10^2 up to 10^6 samples
+    '''
+    grid = setup_grid(-2-1.3j, 0.6+1.3j, 100)
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+
+    for exponent in range(2, 5 if quick else 7):
+        samples = 10 ** exponent
+
+        # linear sampling covers a grid with about samples points
+        side = int(np.sqrt(samples))
+        yield (f'sampler/linear/n=10^{exponent}', side * side, 'samples',
+               lambda side=side: linear_sampling(xmin, ymin, side, side, delta))
+
+        for method in SAMPLING_METHODS:
+            # orthogonal sampling needs a perfect square
+            amount = int(np.sqrt(samples)) ** 2 if method == 'ortho' else samples
+            yield (f'sampler/{method}/n=10^{exponent}', amount, 'samples',
+                   lambda method=method, amount=amount: draw_samples(method, grid, amount, np.random.default_rng(0)))
+
+
+
+def render_cases(quick):
+    '''
+    megapixels per second of set_colors, plain, smooth and with boundary tracing
+    '''
+    samples = 300 if quick else 1000
+    xdim, ydim = setup_grid(-2-1.3j, 0.6+1.3j, samples)[6:8]
+
+    for name, options in (('plain', {}), ('smooth', {'smooth': True}), ('boundary_trace', {'boundary_trace': True}),
+                          ('symmetric', {'symmetric': True})):
+        yield (f'set_colors/{name}', xdim * ydim / 1e6, 'megapixels',
+               lambda options=options: set_colors(-2-1.3j, 0.6+1.3j, 100, samples, **options))
+
+
+
+def io_cases(quick):
+    '''
+    megabytes per second of a write and read round trip of replicates as csv and as npy
+    '''
+    data = np.random.default_rng(0).random((10, 10 ** 4 if quick else 10 ** 5))
+    megabytes = data.nbytes / 1e6
+    directory = tempfile.mkdtemp()
+
+    def csv_round_trip():
+        path = os.path.join(directory, 'benchmark.csv')
+        np.savetxt(path, data, delimiter=',')
+        np.loadtxt(path, delimiter=',')
+
+    def npy_round_trip():
+        save_results('benchmark', data, {'benchmark': True}, directory)
+        np.asarray(load_results('benchmark', directory, mmap_mode=None)[0])
+
+    yield 'io/csv_round_trip', megabytes, 'MB', csv_round_trip
+    yield 'io/npy_round_trip', megabytes, 'MB', npy_round_trip
+
+    shutil.rmtree(directory)
+
+
+
+CASES = {'kernel': kernel_cases, 'samplers': sampler_cases, 'render': render_cases, 'io': io_cases, 
+         'mixed_precision': mixed_precision_cases}
+
+# groups that are run when no groups are given
+DEFAULT_GROUPS = ('kernel', 'samplers', 'render', 'io')
+
+
+def machine_info():
+    '''
+    returns a description of the machine and the software versions
+    '''
+    return {'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'scipy': scipy.__version__}
+
+
+
+def run_benchmarks(groups = DEFAULT_GROUPS, quick = False, repeats = 3):
+    '''
+    runs the cases of the given groups, returns a dict with per case the best time, the amount of work and the rate
+    '''
+    results = {}
+
+    for group in groups:
+        for name, amount, unit, function in CASES[group](quick):
+            seconds = best_time(function, repeats)
+            results[name] = {'seconds': seconds, 'amount': amount, 'unit': unit, 'rate': amount / seconds}
+            print(f"{name:<45}{amount / seconds:>14.4g} {unit}/s")
+
+    return results
+
+
+
+def compare(results, baseline, threshold = 0.2):
+    '''
+    returns the names of the cases that are more than threshold (a fraction) slower than in the baseline. Cases
+    that are missing from either run, or were run with another amount of work, are skipped.
+    '''
+    regressions = []
+
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or reference['amount'] != result['amount']:
+            continue
+
+        change = result['seconds'] / reference['seconds'] - 1
+        if change > threshold:
+            regressions.append(name)
+            print(f"regression {name}: {reference['seconds']:.4g} s -> {result['seconds']:.4g} s ({change:+.0%})")
+
+    return regressions
+
+
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description='benchmarks of the mandelbrot code')
+    parser.add_argument('--output', default='benchmark.json', help='json file to write the results to')
+    parser.add_argument('--baseline', help='json file with earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown as a fraction, e.g. 0.2')
+    parser.add_argument('--groups', nargs='+', choices=tuple(CASES), default=DEFAULT_GROUPS, 
+                        help=f'groups of cases, {" ".join(DEFAULT_GROUPS)} by default')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per case, the fastest one is kept')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes for a fast check')
+    arguments = parser.parse_args(arguments)
+
+    results = run_benchmarks(arguments.groups, arguments.quick, arguments.repeats)
+
+    with open(arguments.output, 'w') as myfile:
+        json.dump({'machine': machine_info(), 'quick': arguments.quick, 'results': results}, myfile, indent=2)
+
+    if arguments.baseline is None:
+        return 0
+
+    with open(arguments.baseline) as myfile:
+        baseline = json.load(myfile)
+
+    regressions = compare(results, baseline['results'], arguments.threshold)
+    print(f"{len(regressions)} regressions against {arguments.baseline}")
+
+    return 1 if regressions else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
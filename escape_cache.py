@@ -0,0 +1,170 @@
+'''
+Disk cache for the escape iterations of the samples of a simulation. An entry is identified by the sampling method,
+the seed, the grid from setup_grid, the amount of samples, whether the kernel shortcuts were used and CACHE_VERSION, so
+a rerun with the same parameters does not have to compute the points again. An entry computed with a high max_iter also answers requests for a lower max_iter. When the
+cache grows past its size limit the least recently used entries are removed.
+'''
+
+import os
+import glob
+import json
+import hashlib
+import zipfile
+import tempfile
+import numpy as np
+import instrumentation
+from functions import escape_counts, count_dtype
+from sampling_methods import draw_samples
+
+
+# part of every key, raise it when the samplers or the kernel change what they return for the same parameters
+CACHE_VERSION = 2
+
+
+
+def _seed_identity(seed):
+    '''
+    returns a json representation of a seed, None if the seed does not fix the random numbers
+    '''
+    if isinstance(seed, np.random.SeedSequence):
+        return {'entropy': seed.entropy, 'spawn_key': list(seed.spawn_key), 'pool_size': seed.pool_size}
+    if isinstance(seed, (int, np.integer)):
+        return int(seed)
+
+    return None
+
+
+
+class EscapeCache:
+    '''
+    Stores escape iterations as npz files in directory, using at most max_bytes of disk space.
+    '''
+
+    def __init__(self, directory = 'cache', max_bytes = 2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+
+    @staticmethod
+    def key(method, seed, grid, samples, shortcuts = False):
+        '''
+        returns the hash that identifies the escape iterations of the samples drawn with method and seed on grid, 
+        computed with or without the shortcuts of escape_counts. None if seed is not fixed.
+        '''
+        seed = _seed_identity(seed)
+        if seed is None:
+            return None
+
+        # repr keeps the floats of the grid exact
+        description = json.dumps({'method': method, 'seed': seed, 'grid': [repr(float(value)) for value in grid],
+                                  'samples': int(samples), 'shortcuts': bool(shortcuts), 'version': CACHE_VERSION},
+                                 sort_keys=True)
+
+        return hashlib.sha256(description.encode()).hexdigest()
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+
+    def get(self, key, max_iter):
+        '''
+        returns the escape iterations for max_iter, None if there is no entry computed with at least max_iter
+        '''
+        path = self._path(key)
+
+        try:
+            with np.load(path) as entry:
+                if int(entry['max_iter']) < max_iter:
+                    return None
+                iters = np.minimum(entry['iters'], max_iter).astype(count_dtype(max_iter))
+        except (FileNotFoundError, ValueError, OSError, zipfile.BadZipFile):
+            return None
+
+        # mark the entry as recently used, another process may have evicted it in the meantime
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return iters
+
+
+    def put(self, key, iters, max_iter):
+        '''
+        stores the escape iterations computed with max_iter, an entry with a higher max_iter is kept
+        '''
+        path = self._path(key)
+
+        try:
+            with np.load(path) as entry:
+                if int(entry['max_iter']) >= max_iter:
+                    return
+        except (FileNotFoundError, ValueError, OSError, zipfile.BadZipFile):
+            pass
+
+        # write to a temporary file first, so other processes never read half an entry
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as myfile:
+            np.savez(myfile, iters=np.asarray(iters).astype(count_dtype(max_iter)), max_iter=max_iter)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+
+    def evict(self):
+        '''
+        removes the least recently used entries until the cache fits in max_bytes
+        '''
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+    def size(self):
+        '''
+        returns the disk space used by the cache in bytes
+        '''
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.directory, '*.npz')))
+
+
+
+def cached_escape_counts(cache, method, seed, grid, samples, max_iter, shortcuts = False):
+    '''
+    returns the escape iterations of the samples drawn with method and seed on grid. The cache is used when it has an
+    entry with at least max_iter, otherwise the samples are drawn and computed and the result is stored. cache can be
+    None to always compute.
+    '''
+    key = EscapeCache.key(method, seed, grid, samples, shortcuts) if cache is not None else None
+
+    if key is not None:
+        with instrumentation.stage('cache_read'):
+            iters = cache.get(key, max_iter)
+        if iters is not None:
+            instrumentation.count('cache_hits')
+            return iters
+
+    complex_values = draw_samples(method, grid, samples, np.random.default_rng(seed))
+    with instrumentation.stage('kernel'):
+        iters = escape_counts(complex_values, max_iter, shortcuts)
+
+    if key is not None:
+        with instrumentation.stage('cache_write'):
+            cache.put(key, iters, max_iter)
+
+    return iters
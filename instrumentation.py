@@ -0,0 +1,152 @@
+'''
+Opt-in instrumentation of the simulations. Stages (sampling, the escape kernel, running area bookkeeping, writing
+results) are timed in wall clock and cpu time, and the kernel counts the iterations it executed, the points that
+escaped and the points that reached max_iter. Everything is off until enable() is called; a disabled stage is a shared
+no-op context manager, so the hooks in the hot paths cost next to nothing. Results can be exported as json or as a
+Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+    import instrumentation
+    instrumentation.enable()
+    ...
+    instrumentation.export_json('data/instrumentation.json')
+    instrumentation.export_trace('data/trace.json')
+
+Measurements are kept per process, so run simulations with workers = 1 to include the work of the replicates.
+'''
+
+import os
+import time
+import json
+import threading
+import contextlib
+from collections import defaultdict
+
+
+_enabled = False
+_events = []
+_counters = defaultdict(int)
+_origin = time.perf_counter()
+
+# returned by stage() when instrumentation is off
+_NO_STAGE = contextlib.nullcontext()
+
+
+
+def enable():
+    '''
+    switches instrumentation on
+    '''
+    global _enabled
+    _enabled = True
+
+
+
+def disable():
+    '''
+    switches instrumentation off, the measurements so far are kept
+    '''
+    global _enabled
+    _enabled = False
+
+
+
+def enabled():
+    '''
+    returns True if instrumentation is on
+    '''
+    return _enabled
+
+
+
+def reset():
+    '''
+    removes all measurements
+    '''
+    global _origin
+    _events.clear()
+    _counters.clear()
+    _origin = time.perf_counter()
+
+
+
+class _Stage:
+    '''
+    context manager that records the wall clock and cpu time of one stage
+    '''
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+
+    def __exit__(self, *exception):
+        cpu = time.thread_time() - self.cpu
+        wall = time.perf_counter() - self.wall
+        _events.append((self.name, self.category, self.wall - _origin, wall, cpu, os.getpid(), threading.get_ident()))
+
+
+
+def stage(name, category = 'stage'):
+    '''
+    returns a context manager that times the code inside it as stage name, e.g. with stage('kernel'): ...
+    '''
+    if not _enabled:
+        return _NO_STAGE
+
+    return _Stage(name, category)
+
+
+
+def count(name, amount = 1):
+    '''
+    adds amount to the counter called name
+    '''
+    if _enabled:
+        _counters[name] += int(amount)
+
+
+
+def summary():
+    '''
+    returns a dict with per stage the amount of calls and the total wall clock and cpu time, and the counters
+    '''
+    stages = {}
+    for name, category, start, wall, cpu, pid, tid in _events:
+        totals = stages.setdefault(name, {'category': category, 'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        totals['calls'] += 1
+        totals['wall'] += wall
+        totals['cpu'] += cpu
+
+    return {'stages': stages, 'counters': dict(_counters)}
+
+
+
+def export_json(path):
+    '''
+    writes the summary to a json file
+    '''
+    with open(path, 'w') as myfile:
+        json.dump(summary(), myfile, indent=2)
+
+
+
+def export_trace(path):
+    '''
+    writes every recorded stage as a complete event in the Chrome trace format, with the counters at the end
+    '''
+    events = [{'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1e6, 'dur': wall * 1e6, 'pid': pid, 'tid': tid,
+               'args': {'cpu_ms': cpu * 1e3}}
+              for name, category, start, wall, cpu, pid, tid in _events]
+
+    end = max((event['ts'] + event['dur'] for event in events), default=0)
+    events += [{'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}}
+               for name, value in _counters.items()]
+
+    with open(path, 'w') as myfile:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, myfile)
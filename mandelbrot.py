@@ -15,11 +15,21 @@ cmax = 0.6+1.3j
 samples = 40 ** 2
 max_iter = 100
 
+# interpolate the colors with the fractional iteration count
+smooth = False
+
+# only compute the borders of uniform regions (Mariani-Silver), cannot be combined with smooth. Not exact (a few pixels
+# can differ) and only faster than the plain render at high max_iter
+boundary_trace = False
+
+# only compute the rows on and above the real axis and mirror the rest, the domain has to be symmetric
+symmetric = True
+
 # set parameters of the cartesian grid the grid
 xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = setup_grid(cmin, cmax, samples)
 
 # plot mandelbrot
-color_array = set_colors(cmin,cmax, max_iter, samples)
+color_array = set_colors(cmin,cmax, max_iter, samples, smooth, boundary_trace=boundary_trace, symmetric=symmetric)
 plt.figure(figsize=(8,8))
 plt.imshow(color_array, zorder=1, interpolation='none')
 
@@ -0,0 +1,132 @@
+'''
+Runs the replicates of a sample simulation on a pool of worker processes. Every (replicate, sampling method) pair is 
+a separate job with its own random stream, so the results do not depend on the amount of workers.
+'''
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functions import RunningStats, compute_areas, running_areas
+from escape_cache import cached_escape_counts
+from sampling_methods import SAMPLING_METHODS, draw_samples, spawn_seeds
+
+
+
+def simulate_replicate(method, seed, grid, samples, max_iter, total_area, checkpoints = None, cache = None, symmetric = False):
+    '''
+    Runs a single replicate for one sampling method, returns the running area of the mandelbrot set at every sample or 
+    at the checkpoints. With an EscapeCache the escape iterations are read from or stored in the cache. With symmetric
+    grid is the upper half of the domain (setup_grid with symmetric) and the areas are doubled.
+    '''
+    if cache is not None:
+        iters = cached_escape_counts(cache, method, seed, grid, samples, max_iter)
+        return running_areas(iters, max_iter, total_area, checkpoints, symmetric)
+    
+    complex_values = draw_samples(method, grid, samples, np.random.default_rng(seed))
+    
+    return compute_areas(complex_values, max_iter, total_area, checkpoints=checkpoints, symmetric=symmetric)
+
+
+
+def simulate_block(method, seeds, grid, samples, max_iter, total_area, checkpoints = None, cache = None, symmetric = False):
+    '''
+    Runs a replicate per seed in seeds for one sampling method and returns their RunningStats instead of the running 
+    areas, so a worker only sends back one aggregate per block of replicates.
+    '''
+    stats = RunningStats(samples if checkpoints is None else len(checkpoints))
+    for seed in seeds:
+        stats.add(simulate_replicate(method, seed, grid, samples, max_iter, total_area, checkpoints, cache, symmetric))
+    
+    return stats
+
+
+
+def replicate_jobs(seed, sims, methods = SAMPLING_METHODS):
+    '''
+    Returns the list of (replicate, method, seed) jobs. Every replicate spawns one stream per sampling method in the 
+    order of SAMPLING_METHODS, so a method gets the same stream whichever other methods are run.
+    '''
+    jobs = []
+    for i, replicate_seed in enumerate(spawn_seeds(seed, sims)):
+        method_seeds = dict(zip(SAMPLING_METHODS, replicate_seed.spawn(len(SAMPLING_METHODS))))
+        
+        for method in methods:
+            jobs.append((i, method, method_seeds[method]))
+    
+    return jobs
+
+
+
+def finished_replicates(jobs, grid, samples, max_iter, checkpoints = None, workers = None, cache = None, symmetric = False,
+                        simulate = simulate_replicate):
+    '''
+    Runs the jobs on workers processes (all cores if None, in this process if 1) and yields (replicate, method, areas) 
+    as soon as a job is finished. simulate is called with the method and seed of a job; with simulate_block the 
+    seed of a job is a list of seeds and a RunningStats is yielded instead of the areas.
+    '''
+    total_area = grid[4] * grid[5]
+    
+    if workers is None:
+        workers = os.cpu_count()
+    
+    if workers == 1:
+        for finished, (i, method, method_seed) in enumerate(jobs):
+            print(f"simulating: {int(finished / len(jobs) * 100)} %", end = '\r')
+            yield i, method, simulate(method, method_seed, grid, samples, max_iter, total_area, checkpoints, cache, symmetric)
+    
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(simulate, method, method_seed, grid, samples, max_iter, total_area, checkpoints, cache, symmetric): (i, method) 
+                       for i, method, method_seed in jobs}
+            
+            # finished futures are removed, so their results are freed once they are handed on
+            for finished, future in enumerate(as_completed(futures)):
+                print(f"simulating: {int(finished / len(jobs) * 100)} %", end = '\r')
+                i, method = futures.pop(future)
+                yield i, method, future.result()
+
+
+
+def run_replicates(grid, samples, max_iter, sims, seed, methods = SAMPLING_METHODS, workers = None, checkpoints = None, 
+                   stats_only = False, cache = None, symmetric = False, block_size = 4):
+    '''
+    Runs sims replicates for all methods on workers processes (all cores if None, in this process if 1). Returns a 
+    dict with per method an array with a row of running areas per replicate, in replicate order. With checkpoints 
+    only the areas after those sample counts are kept. With stats_only the replicates are not stored: every job 
+    aggregates block_size consecutive replicates into a RunningStats, and these are merged into a RunningStats per 
+    method. With an EscapeCache, replicates that were computed before are read from the cache. With symmetric grid is 
+    the upper half of the domain (setup_grid with symmetric) and the areas are doubled.
+    '''
+    jobs = replicate_jobs(seed, sims, methods)
+    columns = samples if checkpoints is None else len(checkpoints)
+    
+    if not stats_only:
+        finished = finished_replicates(jobs, grid, samples, max_iter, checkpoints, workers, cache, symmetric)
+        
+        # results are written into preallocated arrays at the index of their replicate
+        results = {method: np.empty((sims, columns)) for method in methods}
+        for i, method, areas in finished:
+            results[method][i] = areas
+        
+        return results
+    
+    # a job per block of consecutive replicates, with the same streams as the replicates on their own
+    method_seeds = {method: [method_seed for i, job_method, method_seed in jobs if job_method == method] for method in methods}
+    blocks = [(start // block_size, method, method_seeds[method][start:start + block_size]) 
+              for start in range(0, sims, block_size) for method in methods]
+    finished = finished_replicates(blocks, grid, samples, max_iter, checkpoints, workers, cache, symmetric, simulate_block)
+    
+    # blocks are merged in block order, so the statistics do not depend on the amount of workers. Blocks that finish 
+    # early wait in pending until it is their turn
+    stats = {method: RunningStats(columns) for method in methods}
+    pending = {method: {} for method in methods}
+    next_block = {method: 0 for method in methods}
+    
+    for block, method, block_stats in finished:
+        pending[method][block] = block_stats
+        
+        while next_block[method] in pending[method]:
+            stats[method].merge(pending[method].pop(next_block[method]))
+            next_block[method] += 1
+    
+    return stats
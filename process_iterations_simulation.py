@@ -2,9 +2,8 @@
 Processes data from the iteration simulation. Shows data as a plot. 
 '''
 
-from numpy import genfromtxt
 import matplotlib.pyplot as plt
-import numpy as np
+from result_store import load_results, sample_axis
 
 # random = genfromtxt('data_backup/sample_sim/itsim_random.csv', delimiter=',')
 # lhc = genfromtxt('data_backup/sample_sim/itsim_lhc.csv', delimiter = ',')
@@ -17,19 +16,24 @@ plt.rcParams['mathtext.fontset'] = 'stix'
 plt.rcParams['font.family'] = 'STIXGeneral'
 plt.rcParams['figure.dpi']= 500
 
-random = genfromtxt('data_backup/sample_sim/total_rand_v01.csv', delimiter=',')
+# folder with the stored results, csv files from older runs can be converted with result_store.convert_csv
+data_directory = 'data_backup/sample_sim'
 
-max_iters = np.array([10])
-max_iters = np.append(max_iters, np.arange(20,100,10))
-max_iters = np.append(max_iters, np.arange(100,1000,100))
-max_iters = np.append(max_iters, np.arange(1000,11000,1000))
+# the max_iters, samples and checkpoints of the simulation are stored next to the data
+random, metadata = load_results('total_rand_v01', data_directory)
+max_iters = metadata['max_iters']
+sample_counts = sample_axis(metadata, random.shape[1])
+samples = metadata.get('samples', int(sample_counts[-1]))
+
+# leave out the first 100 samples
+later = sample_counts > 100
 
 # for i in range(0, len(random)):
 fig, axs = plt.subplots(1, 1, figsize=(14, 12))
 for i in range(3, len(random), 4):
-    axs.plot(random[i][100:], linewidth=0.5, label=f'{max_iters[i]} iters')
+    axs.plot(sample_counts[later], random[i][later], linewidth=0.5, label=f'{max_iters[i]} iters')
     
-axs.set_title('Area convergence for different iterations for 10,000 samples using random sampling')
+axs.set_title(f'Area convergence for different iterations for {samples:,} samples using random sampling')
 axs.set_xlabel('Samples')
 axs.set_ylabel('Area')
 plt.legend(loc='upper right')
@@ -39,10 +43,12 @@ for spine in ('top', 'right', 'bottom', 'left'):
     axs.spines[spine].set_visible(False)
 plt.show()
 
-max_iters,final_rand_areas = np.loadtxt("data_backup/sample_sim/iterconv_rand.csv", delimiter=",", unpack=True)
-max_iters,final_lhc_areas = np.loadtxt("data_backup/sample_sim/iterconv_lhc.csv", delimiter=",", unpack=True)
-max_iters,final_ortho_areas = np.loadtxt("data_backup/sample_sim/iterconv_ortho.csv", delimiter=",", unpack=True)
-max_iters,final_quasi_areas = np.loadtxt("data_backup/sample_sim/iterconv_quasi.csv", delimiter=",", unpack=True)
+# the final areas are taken after all samples of the simulation
+final_rand, final_metadata = load_results('iterconv_rand', data_directory)
+max_iters,final_rand_areas = final_rand.T
+max_iters,final_lhc_areas = load_results('iterconv_lhc', data_directory)[0].T
+max_iters,final_ortho_areas = load_results('iterconv_ortho', data_directory)[0].T
+max_iters,final_quasi_areas = load_results('iterconv_quasi', data_directory)[0].T
 
 # plot the data 
 fig, axs = plt.subplots(1, 1, figsize=(14, 12))
@@ -52,7 +58,7 @@ axs.plot(max_iters, final_lhc_areas, label = 'LHC sampling')
 axs.plot(max_iters, final_ortho_areas, label = 'Orthogonal sampling')
 axs.plot(max_iters, final_quasi_areas, label = 'Quasi Monte Carlo sampling')
 
-axs.set_title('Area estimates for different iterations after 1225 samples')
+axs.set_title(f"Area estimates for different iterations after {final_metadata.get('samples', 1225)} samples")
 axs.set_xlabel('Iterations')
 axs.set_ylabel('Area')
 
@@ -1,39 +1,65 @@
 '''
 Processes data from the sample simulation. Shows data as a plot. 
 '''
-from numpy import genfromtxt
 import matplotlib.pyplot as plt
-from functions import mean, std
+from functions import RunningStats, aggregate
+from result_store import load_results, load_metadata, sample_axis
 
 
 # ----------------------------------------------------------------------------------------------------------------------------
 # READ DATA OF SIM
 # ----------------------------------------------------------------------------------------------------------------------------
 
-random = genfromtxt('data_backup/sample_sim/samplesim_random.csv', delimiter=',')
-lhc = genfromtxt('data_backup/sample_sim/samplesim_lhc.csv', delimiter = ',')
-ortho = genfromtxt('data_backup/sample_sim/samplesim_orthogonal.csv', delimiter = ',')
-qmc = genfromtxt('data_backup/sample_sim/samplesim_qmc.csv', delimiter = ',')
+# folder with the stored results, csv files from older runs can be converted with result_store.convert_csv
+data_directory = 'data_backup/sample_sim'
+
+# read the aggregates stored by simulate_samples.py with stats_only instead of the raw replicates
+use_aggregate = False
+
+if use_aggregate:
+    random_stats = RunningStats.load(f'{data_directory}/samplesim_random_stats.npz')
+    lhc_stats = RunningStats.load(f'{data_directory}/samplesim_lhc_stats.npz')
+    ortho_stats = RunningStats.load(f'{data_directory}/samplesim_orthogonal_stats.npz')
+    qmc_stats = RunningStats.load(f'{data_directory}/samplesim_qmc_stats.npz')
+    metadata = load_metadata('samplesim_random_stats', data_directory)
+
+else:
+    random, metadata = load_results('samplesim_random', data_directory)
+    lhc, _ = load_results('samplesim_lhc', data_directory)
+    ortho, _ = load_results('samplesim_orthogonal', data_directory)
+    qmc, _ = load_results('samplesim_qmc', data_directory)
+    
+    random_stats = aggregate(random)
+    lhc_stats = aggregate(lhc)
+    ortho_stats = aggregate(ortho)
+    qmc_stats = aggregate(qmc)
 
 
 # ----------------------------------------------------------------------------------------------------------------------------
 # COMPUTE MEAN AND STD OF DATA
 # ----------------------------------------------------------------------------------------------------------------------------
 
-random_mean = mean(random)
-random_std = std(random)
+random_mean = random_stats.mean
+random_std = random_stats.std()
+
+lhc_mean = lhc_stats.mean
+lhc_std = lhc_stats.std()
+
+ortho_mean = ortho_stats.mean
+ortho_std = ortho_stats.std()
 
-lhc_mean = mean(lhc)
-lhc_std = std(lhc)
+qmc_mean = qmc_stats.mean
+qmc_std = qmc_stats.std()
 
-ortho_mean = mean(ortho)
-ortho_std = std(ortho)
+sims = random_stats.count
 
-qmc_mean = mean(qmc)
-qmc_std = std(qmc)
+# the sample counts of the stored areas (the checkpoints of the simulation) and its parameters
+sample_counts = sample_axis(metadata, len(random_mean))
+samples = metadata.get('samples', int(sample_counts[-1]))
+max_iter = metadata.get('max_iter')
 
-sims = len(random)
-samples = (len(random[0]))
+first = sample_counts <= 200
+middle = (sample_counts > 20) & (sample_counts <= 1200)
 
 # ----------------------------------------------------------------------------------------------------------------------------
 # PLOT DATA
@@ -48,11 +74,11 @@ plt.rcParams['figure.dpi']= 500
 
 fig, axs = plt.subplots(3, 1, figsize=(14, 12))
 fig.tight_layout(pad = 5)
-fig.suptitle(f"Area of {sims} simulations of the Mandelbrot set with {samples} samples and 100 iterations")
+fig.suptitle(f"Area of {sims} simulations of the Mandelbrot set with {samples} samples and {max_iter} iterations")
 
-axs[0].plot(random_mean[0:200], label = 'Random sampling', lw = .5)
-axs[0].plot(lhc_mean[0:200], label = 'LHC sampling', lw = .5)
-axs[0].plot(ortho_mean[0:200], label = 'Orthogonal sampling', lw = .5)
+axs[0].plot(sample_counts[first], random_mean[first], label = 'Random sampling', lw = .5)
+axs[0].plot(sample_counts[first], lhc_mean[first], label = 'LHC sampling', lw = .5)
+axs[0].plot(sample_counts[first], ortho_mean[first], label = 'Orthogonal sampling', lw = .5)
 axs[0].set_title(f"Mean of area over first 200 samples of {sims} simulations per sampling technique")
 axs[0].legend()
 axs[0].set_xlabel('Samples')
@@ -62,9 +88,9 @@ axs[0].grid()
 for spine in ('top', 'right', 'bottom', 'left'):
     axs[0].spines[spine].set_visible(False)
 
-axs[1].plot(random_mean, label = 'Random sampling', lw = .5)
-axs[1].plot(lhc_mean, label = 'LHC sampling', lw = .5)
-axs[1].plot(ortho_mean, label = 'Orthogonal sampling', lw = .5)
+axs[1].plot(sample_counts, random_mean, label = 'Random sampling', lw = .5)
+axs[1].plot(sample_counts, lhc_mean, label = 'LHC sampling', lw = .5)
+axs[1].plot(sample_counts, ortho_mean, label = 'Orthogonal sampling', lw = .5)
 axs[1].set_title(f"Mean of area over {sims} simulations per sampling technique")
 axs[1].legend()
 axs[1].set_xlabel('Samples')
@@ -74,9 +100,9 @@ axs[1].grid()
 for spine in ('top', 'right', 'bottom', 'left'):
     axs[1].spines[spine].set_visible(False)
 
-axs[2].plot(random_std[20:1200], label = 'Random sampling', lw = .5)
-axs[2].plot(lhc_std[20:1200], label = 'LHC sampling', lw = .5)
-axs[2].plot(ortho_std[20:1200], label = 'Orthogonal sampling', lw=.5)
+axs[2].plot(sample_counts[middle], random_std[middle], label = 'Random sampling', lw = .5)
+axs[2].plot(sample_counts[middle], lhc_std[middle], label = 'LHC sampling', lw = .5)
+axs[2].plot(sample_counts[middle], ortho_std[middle], label = 'Orthogonal sampling', lw=.5)
 axs[2].set_title(f"Standard deviation of {sims} simulations per sampling technique")
 axs[2].legend()
 axs[2].set_xlabel('Samples')
@@ -0,0 +1,226 @@
+'''
+Stores simulation results as binary .npy files with a .json sidecar that holds the parameters of the simulation
+(sampling method, samples, max_iter(s), seed, bounds, ...). Files can be read without copying with mmap_mode and
+replicates can be appended to an existing file. Running this script converts the csv files in the data folder (or in 
+the folder given as argument).
+'''
+
+import os
+import io
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import numpy as np
+import instrumentation
+
+
+
+def _to_json(value):
+    '''
+    converts the numpy and complex values in the metadata to something json can store
+    '''
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, complex):
+        return [value.real, value.imag]
+    if isinstance(value, np.random.SeedSequence):
+        return {'entropy': value.entropy, 'spawn_key': list(value.spawn_key)}
+
+    raise TypeError(f"cannot store {type(value).__name__} in the metadata")
+
+
+
+def _paths(name, directory):
+    '''
+    returns the paths of the data file and metadata file of a result
+    '''
+    return os.path.join(directory, name + '.npy'), os.path.join(directory, name + '.json')
+
+
+
+def _header(dtype, shape):
+    '''
+    returns the .npy header for an array with the given dtype and shape
+    '''
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                                                  'shape': shape})
+
+    return header.getvalue()
+
+
+
+def save_metadata(name, metadata, directory = 'data'):
+    '''
+    writes the metadata sidecar of a result
+    '''
+    _, metadata_path = _paths(name, directory)
+
+    with open(metadata_path, 'w') as myfile:
+        json.dump(metadata, myfile, default=_to_json, indent=2)
+
+
+
+def load_metadata(name, directory = 'data'):
+    '''
+    reads the metadata sidecar of a result, returns an empty dict if there is none
+    '''
+    _, metadata_path = _paths(name, directory)
+
+    if not os.path.exists(metadata_path):
+        return {}
+
+    with open(metadata_path) as myfile:
+        return json.load(myfile)
+
+
+
+def save_results(name, data, metadata = None, directory = 'data'):
+    '''
+    stores an array of results (e.g. a row of running areas per replicate) with its metadata
+    '''
+    data_path, _ = _paths(name, directory)
+    os.makedirs(directory, exist_ok=True)
+
+    with instrumentation.stage('write_results'):
+        np.save(data_path, np.ascontiguousarray(data))
+        save_metadata(name, metadata or {}, directory)
+
+
+
+def append_results(name, rows, metadata = None, directory = 'data'):
+    '''
+    appends rows (e.g. the replicates that just finished) to a stored result. The rows are written at the end of the
+    file and only the header is updated, so the existing data is not read or rewritten (unless the header outgrows its
+    padding, then the file is copied into a new one that atomically replaces it). The result is created if it does not
+    exist yet. metadata, if given, replaces the stored metadata.
+    '''
+    data_path, _ = _paths(name, directory)
+    rows = np.ascontiguousarray(rows)
+
+    if not os.path.exists(data_path):
+        save_results(name, rows, metadata, directory)
+        return
+
+    with open(data_path, 'r+b') as myfile:
+        version = np.lib.format.read_magic(myfile)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(myfile)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(myfile)
+        header_length = myfile.tell()
+
+        if rows.shape[1:] != shape[1:] or not np.can_cast(rows.dtype, dtype):
+            raise ValueError(f"cannot append rows of shape {rows.shape} and type {rows.dtype} to {name} with shape {shape} "
+                             f"and type {dtype}")
+        rows = rows.astype(dtype, copy=False)
+
+        new_header = _header(dtype, (shape[0] + rows.shape[0],) + shape[1:])
+
+        if len(new_header) == header_length:
+            # the header has the same length, overwrite it and add the rows at the end
+            myfile.seek(0)
+            myfile.write(new_header)
+            myfile.seek(0, os.SEEK_END)
+            myfile.write(rows.tobytes())
+            append_in_place = True
+        else:
+            append_in_place = False
+
+    # the header grew past its padding, this only happens a few times in the life of a file. The file is copied with
+    # the new header into a temporary file that replaces it, so a failed write leaves the stored rows intact
+    if not append_in_place:
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(data_path)), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as new_file, open(data_path, 'rb') as old_file:
+                new_file.write(new_header)
+                old_file.seek(header_length)
+                shutil.copyfileobj(old_file, new_file)
+                new_file.write(rows.tobytes())
+            os.replace(temp_path, data_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    if metadata is not None:
+        save_metadata(name, metadata, directory)
+
+
+
+def load_results(name, directory = 'data', mmap_mode = 'r'):
+    '''
+    returns the stored array and its metadata. With mmap_mode = 'r' the array is memory mapped instead of read, use
+    mmap_mode = None to read it into memory.
+    '''
+    data_path, _ = _paths(name, directory)
+
+    return np.load(data_path, mmap_mode=mmap_mode), load_metadata(name, directory)
+
+
+
+def sample_axis(metadata, columns):
+    '''
+    returns the sample counts that belong to the columns of a stored running area result: the checkpoints in the 
+    metadata, or 1 up to columns when every sample was kept
+    '''
+    checkpoints = metadata.get('checkpoints')
+    if checkpoints is None:
+        return np.arange(1, columns + 1)
+
+    return np.asarray(checkpoints)
+
+
+
+def convert_csv(csv_path, metadata = None, directory = None):
+    '''
+    converts a csv file written with np.savetxt or csv.writer into a stored result with the same name
+    '''
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    if directory is None:
+        directory = os.path.dirname(csv_path)
+
+    data = np.loadtxt(csv_path, delimiter=',', ndmin=2)
+    metadata = dict(metadata or {})
+    metadata['source'] = os.path.basename(csv_path)
+    save_results(name, data, metadata, directory)
+
+    return name
+
+
+
+# max_iters used in simulate_iterations.py, the csv files do not store them themselves
+sweep_max_iters = np.concatenate([[10], np.arange(20, 100, 10), np.arange(100, 1100, 100)])
+long_sweep_max_iters = np.concatenate([[10], np.arange(20, 100, 10), np.arange(100, 1000, 100), np.arange(1000, 11000, 1000)])
+
+csv_metadata = {
+    'samplesim': {'max_iter': 100, 'cmin': -2-1.3j, 'cmax': 0.6+1.3j},
+    'itsim': {'max_iters': sweep_max_iters, 'cmin': -2-1.3j, 'cmax': 0.6+1.3j},
+    'iterconv': {'max_iters': sweep_max_iters, 'cmin': -2-1.3j, 'cmax': 0.6+1.3j},
+    'total_rand': {'method': 'random', 'max_iters': long_sweep_max_iters, 'cmin': -2-1.3j, 'cmax': 0.6+1.3j},
+}
+
+csv_methods = {'random': 'random', 'rand': 'random', 'lhc': 'lhc', 'orthogonal': 'ortho', 'ortho': 'ortho',
+               'qmc': 'qmc', 'quasi': 'qmc'}
+
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    
+    for csv_path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+
+        metadata = {}
+        for prefix, values in csv_metadata.items():
+            if name.startswith(prefix):
+                metadata.update(values)
+
+        method = name.split('_')[-1]
+        if method in csv_methods:
+            metadata['method'] = csv_methods[method]
+
+        convert_csv(csv_path, metadata)
+        print(f"converted {csv_path}")
@@ -0,0 +1,260 @@
+'''
+Runs the experiments described in a json spec. The spec lists the sampling methods, sample counts, max_iter values,
+domains and the amount of replicates; every combination is a job. Jobs are identified by a hash of their parameters,
+so duplicates are run once, and every finished job is written to its own file (atomically, through a temporary file),
+so a run that is killed continues with the missing jobs when it is started again.
+
+    python run_experiments.py experiments/sample_convergence.json --workers 4
+
+A spec looks like (see experiments/sample_convergence.json):
+
+    {
+        "name": "sample_convergence",
+        "methods": ["random", "lhc", "ortho", "qmc"],
+        "samples": [100, 10000],
+        "max_iters": [100],
+        "replicates": 10,
+        "seed": 42,
+        "domains": [{"cmin": [-2, -1.3], "cmax": [0.6, 1.3]}],
+        "checkpoints": 200,
+        "symmetric": false,
+        "cache": "cache"
+    }
+
+checkpoints is the amount of log spaced checkpoints of the running area (null keeps every sample) and cache the
+folder of the escape cache (null disables it). Results are stored in data/experiments/<name> unless the spec gives an
+"output" folder. Replicate i of a method gets the same random stream as in simulate_samples.py with the same seed.
+'''
+
+import os
+import glob
+import json
+import math
+import hashlib
+import argparse
+import tempfile
+import itertools
+import traceback
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functions import setup_grid, log_checkpoints
+from sampling_methods import SAMPLING_METHODS
+from parallel_simulation import simulate_replicate
+from escape_cache import EscapeCache
+
+
+
+def _is_count(value):
+    '''
+    returns True if value is a positive int (not a bool)
+    '''
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+
+def load_spec(path):
+    '''
+    reads an experiment spec, fills in the defaults and checks the values, so a bad spec fails before any job runs
+    '''
+    with open(path) as myfile:
+        spec = json.load(myfile)
+
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    spec.setdefault('methods', list(SAMPLING_METHODS))
+    spec.setdefault('seed', 42)
+    spec.setdefault('domains', [{'cmin': [-2, -1.3], 'cmax': [0.6, 1.3]}])
+    spec.setdefault('checkpoints', None)
+    spec.setdefault('symmetric', False)
+    spec.setdefault('cache', None)
+    spec.setdefault('output', os.path.join('data', 'experiments', spec['name']))
+
+    for field in ('samples', 'max_iters', 'replicates'):
+        if field not in spec:
+            raise ValueError(f"the experiment spec {path} has no {field!r}")
+
+    unknown = set(spec['methods']) - set(SAMPLING_METHODS)
+    if unknown:
+        raise ValueError(f"unknown sampling methods {sorted(unknown)}, choose from {SAMPLING_METHODS}")
+
+    for field in ('samples', 'max_iters'):
+        if not isinstance(spec[field], list) or not spec[field] or not all(_is_count(value) for value in spec[field]):
+            raise ValueError(f"{field!r} of the experiment spec {path} has to be a list of positive ints, got {spec[field]}")
+
+    if not _is_count(spec['replicates']):
+        raise ValueError(f"'replicates' of the experiment spec {path} has to be a positive int, got {spec['replicates']}")
+
+    if spec['checkpoints'] is not None and not _is_count(spec['checkpoints']):
+        raise ValueError(f"'checkpoints' of the experiment spec {path} has to be a positive int or null, "
+                         f"got {spec['checkpoints']}")
+
+    # orthogonal sampling needs a perfect square amount of samples
+    if 'ortho' in spec['methods']:
+        squares = [samples for samples in spec['samples'] if math.isqrt(samples) ** 2 != samples]
+        if squares:
+            raise ValueError(f"orthogonal sampling needs perfect square sample counts, {squares} in {path} are not")
+
+    return spec
+
+
+
+def job_key(job):
+    '''
+    returns the hash that identifies a job, equal jobs get the same key
+    '''
+    return hashlib.sha256(json.dumps(job, sort_keys=True).encode()).hexdigest()[:32]
+
+
+
+def expand_jobs(spec):
+    '''
+    returns a dict with a job per combination of domain, method, samples, max_iter and replicate, keyed by job_key
+    '''
+    jobs = {}
+
+    for domain, method, samples, max_iter, replicate in itertools.product(spec['domains'], spec['methods'],
+                                                                          spec['samples'], spec['max_iters'],
+                                                                          range(spec['replicates'])):
+        job = {'cmin': list(domain['cmin']), 'cmax': list(domain['cmax']), 'method': method, 'samples': int(samples),
+               'max_iter': int(max_iter), 'replicate': replicate, 'seed': spec['seed'],
+               'checkpoints': spec['checkpoints'], 'symmetric': spec['symmetric']}
+        jobs[job_key(job)] = job
+
+    return jobs
+
+
+
+def _result_path(output, key):
+    return os.path.join(output, key + '.npz')
+
+
+
+def run_job(job, cache_directory = None):
+    '''
+    runs a single job, returns the running areas at its checkpoints. Runs in a worker process.
+    '''
+    cmin = complex(*job['cmin'])
+    cmax = complex(*job['cmax'])
+    samples = job['samples']
+    grid = setup_grid(cmin, cmax, samples, job['symmetric'])
+    checkpoints = log_checkpoints(samples, job['checkpoints']) if job['checkpoints'] is not None else None
+
+    # the same stream as replicate_jobs: spawn key (replicate, index of the method)
+    seed = np.random.SeedSequence(job['seed'], spawn_key=(job['replicate'], SAMPLING_METHODS.index(job['method'])))
+    cache = EscapeCache(cache_directory) if cache_directory is not None else None
+
+    return simulate_replicate(job['method'], seed, grid, samples, job['max_iter'], grid[4] * grid[5], checkpoints, cache,
+                              job['symmetric'])
+
+
+
+def save_job(output, key, job, areas):
+    '''
+    writes the result of a job atomically, a result file is either complete or absent
+    '''
+    handle, temp_path = tempfile.mkstemp(dir=output, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as myfile:
+        np.savez(myfile, areas=areas, job=json.dumps(job))
+    os.replace(temp_path, _result_path(output, key))
+
+
+
+def run_experiment(spec, workers = None):
+    '''
+    runs the jobs of spec that have no result yet on workers processes (all cores if None, in this process if 1).
+    Returns the amount of jobs that were run. A job that fails does not stop the others: every finished job is saved,
+    and afterwards a RuntimeError lists the keys of the failed jobs (they are run again by the next run).
+    '''
+    output = spec['output']
+    os.makedirs(output, exist_ok=True)
+
+    # temporary files of jobs that were running when an earlier run was killed
+    for temp_path in glob.glob(os.path.join(output, '*.tmp')):
+        os.remove(temp_path)
+
+    jobs = expand_jobs(spec)
+    todo = [key for key in jobs if not os.path.exists(_result_path(output, key))]
+    print(f"{spec['name']}: {len(jobs)} jobs, {len(jobs) - len(todo)} already done")
+
+    # the experiment description is kept next to the results
+    with open(os.path.join(output, 'spec.json'), 'w') as myfile:
+        json.dump(spec, myfile, indent=2)
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    failures = {}
+
+    if workers == 1:
+        for finished, key in enumerate(todo):
+            print(f"running: {int(finished / len(todo) * 100)} %", end = '\r')
+            try:
+                save_job(output, key, jobs[key], run_job(jobs[key], spec['cache']))
+            except Exception as error:
+                failures[key] = _report_failure(key, jobs[key], error)
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_job, jobs[key], spec['cache']): key for key in todo}
+
+            for finished, future in enumerate(as_completed(futures)):
+                print(f"running: {int(finished / len(todo) * 100)} %", end = '\r')
+                key = futures.pop(future)
+                try:
+                    save_job(output, key, jobs[key], future.result())
+                except Exception as error:
+                    failures[key] = _report_failure(key, jobs[key], error)
+
+    # the other jobs are saved, report the failed ones
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(todo)} jobs failed: {sorted(failures)}") from next(iter(failures.values()))
+
+    return len(todo)
+
+
+
+def _report_failure(key, job, error):
+    '''
+    prints a failed job with its traceback and returns the error
+    '''
+    print(f"\njob {key} failed: {json.dumps(job, sort_keys=True)}")
+    traceback.print_exception(type(error), error, error.__traceback__)
+
+    return error
+
+
+
+def collect_results(spec):
+    '''
+    returns a dict that maps (cmin, cmax, method, samples, max_iter) to an array with a row of running areas per
+    replicate, in replicate order. Replicates that did not finish yet are rows of nan.
+    '''
+    results = {}
+
+    for key, job in expand_jobs(spec).items():
+        cell = (complex(*job['cmin']), complex(*job['cmax']), job['method'], job['samples'], job['max_iter'])
+        path = _result_path(spec['output'], key)
+        if not os.path.exists(path):
+            continue
+
+        with np.load(path) as result:
+            areas = result['areas']
+
+        if cell not in results:
+            results[cell] = np.full((spec['replicates'], areas.size), np.nan)
+        results[cell][job['replicate']] = areas
+
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='runs the experiments of a json spec, finished jobs are skipped')
+    parser.add_argument('spec', help='json file with the experiment spec')
+    parser.add_argument('--workers', type=int, default=None, help='amount of worker processes, all cores by default')
+    arguments = parser.parse_args()
+
+    spec = load_spec(arguments.spec)
+    run_experiment(spec, arguments.workers)
+
+    print('')
+    print(f"finished {spec['name']}, results in {spec['output']}")
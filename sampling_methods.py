@@ -5,191 +5,332 @@ Contains functions for the different sampling methods used in the simulations. M
     - Latin hypercube samling 
     - Orthogonal sampling
     - Quasi montecarlo sampling using a Halton sequence
+    - Randomized quasi montecarlo sampling with scrambled Sobol or Halton sequences (RandomizedQMC)
+
+Samples can be kept compactly as a SampleSet (separate float64 or float32 x and y arrays with their bounds and method).
 '''
 
 import numpy as np
-import itertools 
 import math 
-import random
+import instrumentation
 from scipy.stats import qmc
 
 
-def linear_sampling(xmin, ymin, xdim, ydim, delta):
+def spawn_seeds(seed, n):
     '''
-    return a list of complex samples determined by looping over the grid
+    return n independent seed sequences derived from seed with SeedSequence.spawn. Give every replicate (and every 
+    sampling method within it) its own seed sequence, so the random numbers do not depend on which worker runs the job.
     '''
-    # store the values 
-    complex_values = []
-    
-    # get the values by looping over the grid 
-    for i in range(ydim):
-        for j in range(xdim):
-            c = complex(xmin + j*delta, ymin + i*delta)
-            complex_values.append(c)
-            
-    return complex_values
+    return np.random.SeedSequence(seed).spawn(n)
 
 
 
-def random_sampling(xmin, ymin, xrange, yrange, samples):
+def linear_sampling(xmin, ymin, xdim, ydim, delta, out = None):
     '''
-    return a list of complex samples determined in a random fashion
+    return an array of complex samples on the points of the grid. Like the other samplers it writes into out (a
+    complex array of the right size, e.g. in shared memory) if it is given.
     '''
-    # store the values 
-    complex_values = []
-    
-    # generate certain amount of samples 
-    for sample in range(samples):
-        # generate random complex number 
-        real_part = xmin + xrange * np.random.random()
-        imaginary_part = ymin + yrange * np.random.random()
-        
-        # store random sample 
-        c = complex(real_part, imaginary_part)
-        complex_values.append(c)
-        
+    complex_values = np.empty((ydim, xdim), dtype=complex) if out is None else out.reshape(ydim, xdim)
+    complex_values.real = xmin + np.arange(xdim) * delta
+    complex_values.imag = (ymin + np.arange(ydim) * delta)[:, np.newaxis]
+
+    return complex_values.ravel()
+
+
+
+def random_sampling(xmin, ymin, xrange, yrange, samples, rng = None, out = None):
+    '''
+    return an array of complex samples determined in a random fashion. rng can be a seed or a numpy Generator.
+    '''
+    rng = np.random.default_rng(rng)
+
+    # draw all random numbers at once
+    complex_values = np.empty(samples, dtype=complex) if out is None else out
+    complex_values.real = xmin + xrange * rng.random(samples)
+    complex_values.imag = ymin + yrange * rng.random(samples)
+
     return complex_values
 
 
 
 
-def lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples):
+def lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng = None, jitter = True, 
+                 out = None):
     '''
-    return a list of complex samples determined by a latin hypercube algortihm
+    return an array of complex samples determined by a latin hypercube algortihm. Both axes are split into samples 
+    intervals and one random permutation per axis gives every sample its own row and column. With jitter the sample 
+    is placed randomly inside its cell, otherwise in the centre. rng can be a seed or a numpy Generator.
     '''
-    # number of samples
-    possible_x_values = np.linspace(xmin, xmax, xdim)
-    possible_y_values = np.linspace(ymin, ymax, ydim)
-    
-    # for each sample point remember in which row and column the sample point was taken
-    filled_rows = []
-    filled_columns = []
-    placed_samples = 0
-    complex_values = []
-    
-    # keep creating samples until desired amount is reached 
-    while placed_samples < samples:     
-        x = random.choice(possible_x_values)
-        y = random.choice(possible_y_values)
-        
-        # check legality of the sample 
-        if x not in filled_rows and y not in filled_columns:
-            filled_rows.append(x)
-            filled_columns.append(y)
+    rng = np.random.default_rng(rng)
 
-            # remove the sample location from the possible locations 
-            possible_x_values = np.delete(possible_x_values, np.where(possible_x_values == x))
-            possible_y_values = np.delete(possible_y_values, np.where(possible_y_values == y))
+    # one random permutation per axis decides the row and column of every sample
+    x_cells = rng.permutation(samples)
+    y_cells = rng.permutation(samples)
 
-            placed_samples += 1
+    # position of the sample inside its cell
+    if jitter:
+        x_offsets = rng.random(samples)
+        y_offsets = rng.random(samples)
+    else:
+        x_offsets = 0.5
+        y_offsets = 0.5
 
-            c = complex(x, y)
-            complex_values.append(c)
+    complex_values = np.empty(samples, dtype=complex) if out is None else out
+    complex_values.real = xmin + xrange * (x_cells + x_offsets) / samples
+    complex_values.imag = ymin + yrange * (y_cells + y_offsets) / samples
 
     return complex_values
 
 
 
 
-def ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples):
-    '''
-    return a list of complex samples by a orthogonal sampling algorithm 
-    '''
-    # determine the amount of subsquares needed
-    subsquares = samples
-  
-    
-    # determine the x and y dimensions of the grid and store them as list for easy acces 
-    grid_dim = int(math.sqrt(samples))
-    subsq_rows = []
-    subsq_cols = []
-    
-    for i in range(0, grid_dim):
-        subsq_rows.append(i)
-        subsq_cols.append(i)
-
-    # store all x and y values where samples can be taken 
-    possible_x_values = np.linspace(xmin, xmax, samples)
-    possible_y_values = np.linspace(ymin, ymax, samples)
-    
-    # keep track of samples
-    check_list = []
-    subsquares_filled = []
-
-    # divide possible_x_values into lists corresponding to the subsquares
-    for i in range(len(subsq_rows)):
-        for j in range(len(subsq_cols)):
-            subsq_x = possible_x_values[0+grid_dim*subsq_cols[j]:grid_dim*subsq_cols[j] + grid_dim]
-            subsq_y = possible_y_values[0+grid_dim*subsq_rows[i]:grid_dim*subsq_rows[i] + grid_dim]
-
-            s = [subsq_x, subsq_y]
-
-            coordinates = list(itertools.product(*s))
-            check_list.append(coordinates)
-    
-    # keep track of samples
-    filled_rows = []
-    filled_columns = []
-    placed_samples = 0
-    complex_values = []
-    
-    # keep placing samples until desired amount is reached 
-    while placed_samples < samples:  
-        x = random.choice(possible_x_values)
-        y = random.choice(possible_y_values)
-        
-        # go through all squares and check if sample is legal
-        for i in range(subsquares):
-        
-            # check if the coordinate of the sample point corresponds to a coordinate on the grid 
-            if (x, y) in check_list[i]:
-                # check if the subsquare is not already filled 
-                if i not in subsquares_filled:
-                    subsquares_filled.append(i)
-
-                    # check if the location of the point outside the subsquare is not already filled
-                    if x not in filled_rows and y not in filled_columns:
-                        filled_rows.append(x)
-                        filled_columns.append(y)
-                    
-                        # remove the sample point from the possible points 
-                        possible_x_values =  np.delete(possible_x_values, np.where(possible_x_values == x))
-                        possible_y_values =  np.delete(possible_y_values, np.where(possible_y_values == y))
-                        
-                        # place the sample 
-                        placed_samples += 1
-
-                        # store the sample 
-                        c = complex(x, y)
-                        complex_values.append(c)   
-    
+def ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng = None, jitter = True, 
+                   out = None):
+    '''
+    return an array of complex samples by a orthogonal sampling algorithm. The grid is divided into sqrt(samples) by 
+    sqrt(samples) subsquares with one sample each, and the samples also form a latin hypercube. samples has to be a 
+    perfect square. rng can be a seed or a numpy Generator.
+    '''
+    # determine the amount of subsquares per axis
+    grid_dim = math.isqrt(samples)
+    if grid_dim * grid_dim != samples:
+        raise ValueError(f"orthogonal sampling needs a perfect square amount of samples, got {samples}")
+
+    rng = np.random.default_rng(rng)
+
+    # every subsquare column gets a permutation of the columns inside it, same for the subsquare rows
+    x_perms = rng.permuted(np.tile(np.arange(grid_dim), (grid_dim, 1)), axis=1)
+    y_perms = rng.permuted(np.tile(np.arange(grid_dim), (grid_dim, 1)), axis=1)
+
+    # sample in subsquare (i, j) takes column x_perms[i, j] of subsquare column i and row y_perms[j, i] of subsquare row j
+    blocks = np.arange(grid_dim)[:, np.newaxis] * grid_dim
+    x_cells = (blocks + x_perms).ravel()
+    y_cells = (blocks + y_perms).T.ravel()
+
+    # position of the sample inside its cell
+    if jitter:
+        x_offsets = rng.random(samples)
+        y_offsets = rng.random(samples)
+    else:
+        x_offsets = np.full(samples, 0.5)
+        y_offsets = np.full(samples, 0.5)
+
+    # the samples are built subsquare by subsquare, shuffle them so every prefix is spread over the whole grid
+    order = rng.permutation(samples)
+
+    complex_values = np.empty(samples, dtype=complex) if out is None else out
+    complex_values.real = xmin + xrange * (x_cells[order] + x_offsets[order]) / samples
+    complex_values.imag = ymin + yrange * (y_cells[order] + y_offsets[order]) / samples
+
     return complex_values
 
 
 
 
 
-def quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples):
+class RandomizedQMC:
+    '''
+    Scrambled Sobol or Halton sequence over the box (xmin, ymin) - (xmax, ymax) with replicates independent
+    randomizations. Every draw continues the sequences, so a run can be extended from n to 2n points without
+    recomputing the first n. The spread over the randomizations gives the error of a qmc estimate (see estimate).
+    rng can be a seed or a numpy Generator.
+    '''
+
+    engines = {'sobol': qmc.Sobol, 'halton': qmc.Halton}
+
+    def __init__(self, xmin, ymin, xmax, ymax, replicates = 8, engine = 'sobol', rng = None, scramble = True):
+        if engine not in self.engines:
+            raise ValueError(f"unknown qmc engine {engine!r}, choose from {tuple(self.engines)}")
+
+        self.xmin, self.ymin, self.xmax, self.ymax = xmin, ymin, xmax, ymax
+        self.replicates = replicates
+        self.drawn = 0
+
+        # a single randomization uses rng itself, so quasi_montecarlo draws the same points as before
+        rng = np.random.default_rng(rng)
+        generators = rng.spawn(replicates) if replicates > 1 else [rng]
+        self.samplers = [self.engines[engine](d=2, scramble=scramble, seed=generator) for generator in generators]
+
+
+    def draw(self, n, out = None):
+        '''
+        returns a (replicates, n) array with the next n complex samples of every randomization, written into out if
+        it is given
+        '''
+        if out is None:
+            complex_values = np.empty((self.replicates, n), dtype=complex)
+        else:
+            complex_values = out.reshape(self.replicates, n)
+
+        for values, sampler in zip(complex_values, self.samplers):
+            sample = qmc.scale(sampler.random(n), [self.xmin, self.ymin], [self.xmax, self.ymax])
+            values.real = sample[:, 0]
+            values.imag = sample[:, 1]
+
+        self.drawn += n
+
+        return complex_values
+
+
+    @staticmethod
+    def estimate(replicate_estimates):
+        '''
+        returns the mean of the estimates of the randomizations and its standard error
+        '''
+        replicate_estimates = np.asarray(replicate_estimates, dtype=float)
+
+        return replicate_estimates.mean(), replicate_estimates.std(ddof=1) / np.sqrt(replicate_estimates.size)
+
+
+
+def quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng = None, scramble = True, 
+                     out = None):
+    '''
+    returns an array of complex samples with obtained with a quasi monte carlo simulator. The Halton sequence is 
+    scrambled with rng (a seed or a numpy Generator), so every seed gives an independent randomization. Use 
+    RandomizedQMC to extend a run or to estimate the error from several randomizations.
+    '''
+    sampler = RandomizedQMC(xmin, ymin, xmax, ymax, replicates=1, engine='halton', rng=rng, scramble=scramble)
+
+    return sampler.draw(samples, out)[0]
+
+
+
+class SampleSet:
+    '''
+    Compact set of samples: separate x (real part) and y (imaginary part) arrays, float64 or float32, together with the 
+    bounds (xmin, xmax, ymin, ymax) of the box they were drawn in and the sampling method. float32 halves the memory, 
+    the kernel still iterates in float64. Indexing gives a SampleSet that shares the arrays where numpy does.
+    '''
+
+    def __init__(self, x, y, bounds = None, method = None):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        if self.x.shape != self.y.shape:
+            raise ValueError(f"x and y should have the same shape, got {self.x.shape} and {self.y.shape}")
+
+        self.bounds = bounds
+        self.method = method
+
+
+    @classmethod
+    def from_complex(cls, complex_values, bounds = None, method = None, dtype = np.float64):
+        '''
+        returns a SampleSet with the real and imaginary parts of complex_values stored as dtype
+        '''
+        complex_values = np.asarray(complex_values, dtype=complex)
+
+        return cls(complex_values.real.astype(dtype), complex_values.imag.astype(dtype), bounds, method)
+
+
+    @property
+    def real(self):
+        return self.x
+
+
+    @property
+    def imag(self):
+        return self.y
+
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes
+
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def __getitem__(self, index):
+        return SampleSet(self.x[index], self.y[index], self.bounds, self.method)
+
+
+    def to_complex(self):
+        '''
+        returns the samples as a complex128 array
+        '''
+        complex_values = np.empty(self.x.shape, dtype=complex)
+        complex_values.real = self.x
+        complex_values.imag = self.y
+
+        return complex_values
+
+
+    def tolist(self):
+        '''
+        returns the samples as a list of python complex numbers, for code that still needs lists
+        '''
+        return self.to_complex().tolist()
+
+
+
+# names of the sampling methods, in the order in which their random streams are spawned per replicate
+SAMPLING_METHODS = ('random', 'lhc', 'ortho', 'qmc')
+
+
+def draw_samples(method, grid, samples, rng = None, out = None):
     '''
-    returns a list of complex samples with obtained with a quasi monte carlo simulator 
+    returns an array of complex samples drawn with the sampling method called method ('random', 'lhc', 'ortho' or 'qmc'). 
+    grid is the tuple returned by functions.setup_grid. The samples are written into out if it is given (see 
+    shared_batches). The time spent is recorded per method by instrumentation.
     '''
-    
-    complex_values = []
-    rand = int(np.random.random(1) * 100)
-    sampler = qmc.Halton(d=2, scramble=False, seed=rand)
-    sample = sampler.random(n=samples)
-    
-    l_bounds = [xmin, ymin]
-    u_bounds = [xmax, ymax]
-    
-    sample = qmc.scale(sample, l_bounds, u_bounds)
-    
-    for i in range(0, len(sample)):
-        complex_values.append(complex(sample[i][0], sample[i][1]))
-    
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"unknown sampling method {method!r}, choose from {SAMPLING_METHODS}")
+
+    with instrumentation.stage(f'sampler/{method}', 'sampler'):
+        if method == 'random':
+            complex_values = random_sampling(xmin, ymin, xrange, yrange, samples, rng, out)
+        elif method == 'lhc':
+            complex_values = lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng, out=out)
+        elif method == 'ortho':
+            complex_values = ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng, out=out)
+        else:
+            complex_values = quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, rng, 
+                                              out=out)
+
+    instrumentation.count(f'samples/{method}', samples)
+
     return complex_values
 
 
 
-    
-    
\ No newline at end of file
+def draw_sample_set(method, grid, samples, rng = None, dtype = np.float64):
+    '''
+    returns the samples of draw_samples as a SampleSet with coordinates of type dtype (np.float64 or np.float32)
+    '''
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+
+    return SampleSet.from_complex(draw_samples(method, grid, samples, rng), (xmin, xmax, ymin, ymax), method, dtype)
+
+
+
+def prefix_bias(method, grid, samples, prefix, replicates = 200, rng = None):
+    '''
+    Checks that the first prefix of samples points of method are spread over the whole grid, which the running areas
+    rely on. The mean of the prefix points is averaged over replicates designs and compared with the centre of the
+    grid; returns the deviation of the real and imaginary part in standard errors (both should be within about 3).
+    '''
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+    seeds = spawn_seeds(rng, replicates)
+
+    means = np.array([draw_samples(method, grid, samples, seed)[:prefix].mean() for seed in seeds])
+    deviation = means - complex((xmin + xmax) / 2, (ymin + ymax) / 2)
+    errors = complex(means.real.std(ddof=1), means.imag.std(ddof=1)) / np.sqrt(replicates)
+
+    return deviation.real.mean() / errors.real, deviation.imag.mean() / errors.imag
+
+
+
+if __name__ == '__main__':
+    from functions import setup_grid
+
+    # the mean of the first 10 and 100 points of a design of 10^4 samples should be the centre of the grid
+    grid = setup_grid(-2-1.3j, 0.6+1.3j, 100)
+
+    for method in SAMPLING_METHODS:
+        for prefix in (10, 100):
+            real, imag = prefix_bias(method, grid, 100 ** 2, prefix, rng=42)
+            print(f"{method:<8} first {prefix:<5} points: deviation {real:+.2f}, {imag:+.2f} standard errors")
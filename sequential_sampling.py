@@ -0,0 +1,129 @@
+'''
+Sequential stopping rule for the area of the mandelbrot set. Points are drawn in batches until the confidence interval
+of the area is as narrow as requested or the sample budget is used up. For random, latin hypercube and orthogonal
+sampling every batch is an independent design, so the spread of the batch estimates gives a valid standard error. For
+quasi monte carlo a set of independently scrambled sequences is extended and the error follows from the spread over
+the scramblings.
+'''
+
+import numpy as np
+from scipy import stats
+from functions import compute_areas, escape_counts, setup_grid
+from sampling_methods import SAMPLING_METHODS, RandomizedQMC, draw_samples
+
+
+
+def half_width(batch_areas, confidence = 0.95):
+    '''
+    returns the half-width of the confidence interval of the mean of the batch areas (student t, batch means)
+    '''
+    batches = len(batch_areas)
+    if batches < 2:
+        return np.inf
+
+    quantile = stats.t.ppf(0.5 + confidence / 2, batches - 1)
+
+    return quantile * np.std(batch_areas, ddof=1) / np.sqrt(batches)
+
+
+
+def _converged(area, error, abs_tol, rel_tol):
+    '''
+    returns True if the half-width error is within the absolute or relative tolerance
+    '''
+    return (abs_tol is not None and error <= abs_tol) or (rel_tol is not None and error <= rel_tol * abs(area))
+
+
+
+def sequential_qmc_area(grid, max_iter, abs_tol = None, rel_tol = None, batch_size = 10 ** 4, budget = 10 ** 7,
+                        replicates = 8, engine = 'sobol', confidence = 0.95, rng = None, shortcuts = True, symmetric = False):
+    '''
+    Quasi monte carlo version of sequential_area with a RandomizedQMC of replicates scramblings. The sequences are
+    extended instead of restarted: the first round draws about batch_size points in total and every next round doubles
+    the amount of points per scrambling (powers of two, which keeps the balance of the Sobol sequence), as long as
+    the budget allows. The error is the half-width over the scramblings. Returns the area, the half-width and the
+    amount of samples used.
+    '''
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
+    total_area = 2 * xrange * yrange if symmetric else xrange * yrange
+
+    sampler = RandomizedQMC(xmin, ymin, xmax, ymax, replicates, engine, rng)
+    first = 2 ** max(0, int(np.log2(max(batch_size // replicates, 1))))
+    if first * replicates > budget:
+        raise ValueError(f"{replicates} scramblings of {first} points do not fit in the budget of {budget} samples")
+
+    hits = np.zeros(replicates)
+    draw = first
+
+    while True:
+        iters = escape_counts(sampler.draw(draw), max_iter, shortcuts)
+        hits += np.count_nonzero(iters == max_iter, axis=1)
+
+        replicate_areas = total_area * hits / sampler.drawn
+        area = replicate_areas.mean()
+        error = half_width(replicate_areas, confidence)
+
+        # the next round doubles the points of every scrambling
+        draw = sampler.drawn
+        if _converged(area, error, abs_tol, rel_tol) or 2 * sampler.drawn * replicates > budget:
+            break
+
+    return area, error, sampler.drawn * replicates
+
+
+
+def sequential_area(method, grid, max_iter, abs_tol = None, rel_tol = None, batch_size = 10 ** 4, budget = 10 ** 7,
+                    min_batches = 4, confidence = 0.95, rng = None, shortcuts = True, symmetric = False):
+    '''
+    Estimates the area of the mandelbrot set with sampling method method ('random', 'lhc', 'ortho' or 'qmc') on grid
+    (the tuple of setup_grid). Batches of batch_size points are drawn until the half-width of the confidence interval
+    is at most abs_tol or at most rel_tol times the estimate (after at least min_batches batches), or until the next
+    batch would exceed budget samples. For 'ortho' batch_size has to be a perfect square. 'qmc' is handed to
+    sequential_qmc_area. Returns the area, the half-width of its confidence interval and the amount of samples used.
+    '''
+    if abs_tol is None and rel_tol is None:
+        raise ValueError("give an absolute (abs_tol) or relative (rel_tol) half-width to stop at")
+    if batch_size > budget:
+        raise ValueError(f"batch_size {batch_size} is larger than the budget of {budget} samples")
+
+    if method == 'qmc':
+        return sequential_qmc_area(grid, max_iter, abs_tol, rel_tol, batch_size, budget, confidence=confidence, rng=rng,
+                                   shortcuts=shortcuts, symmetric=symmetric)
+
+    rng = np.random.default_rng(rng)
+    total_area = grid[4] * grid[5]
+    batch_areas = []
+
+    while (len(batch_areas) + 1) * batch_size <= budget:
+        complex_values = draw_samples(method, grid, batch_size, rng)
+        batch_areas.append(compute_areas(complex_values, max_iter, total_area, shortcuts, [batch_size],
+                                         symmetric=symmetric)[0])
+
+        if len(batch_areas) < min_batches:
+            continue
+
+        if _converged(np.mean(batch_areas), half_width(batch_areas, confidence), abs_tol, rel_tol):
+            break
+
+    return np.mean(batch_areas), half_width(batch_areas, confidence), len(batch_areas) * batch_size
+
+
+
+if __name__ == '__main__':
+    # set parameters of the complex grid
+    cmin = -2-1.3j
+    cmax = 0.6+1.3j
+    max_iter = 100
+
+    # stop when the 95% confidence interval is within 0.1% of the area, or after 10^7 samples
+    rel_tol = 1e-3
+    budget = 10 ** 7
+    batch_size = 100 ** 2
+    seed = 42
+
+    grid = setup_grid(cmin, cmax, batch_size)
+
+    for method in SAMPLING_METHODS:
+        area, error, used = sequential_area(method, grid, max_iter, rel_tol=rel_tol, batch_size=batch_size, budget=budget,
+                                            rng=seed)
+        print(f"{method:<8} area {area:.5f} +- {error:.5f} with {used} samples")
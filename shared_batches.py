@@ -0,0 +1,143 @@
+'''
+Shared memory transport between the samplers and the kernel workers. A SharedPointPool owns a block of shared memory
+for the points and one for the escape iterations, and a pool of worker processes that attach to both blocks once, when
+they start. The samplers write their points directly into the shared block (draw_samples with out) and a task is only
+a slice (start, stop) of it: the workers read the points and write the escape iterations in place, so nothing but a
+few integers is pickled per batch, whatever the batch size.
+
+    with SharedPointPool(samples) as pool:
+        draw_samples('lhc', grid, samples, rng, out=pool.points[:samples])
+        iters = pool.escape_counts(samples, max_iter)
+
+escape_counts returns a copy of the shared counts, so iters can be used after the pool is closed. Views on
+pool.points (such as the array draw_samples returns with out) point into the shared memory itself: drop them, or copy
+what you need, before the pool is closed. close() refuses to free the memory while such views exist.
+'''
+
+import os
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, wait
+from functions import escape_counts, running_areas
+from sampling_methods import draw_samples
+
+
+# the shared blocks as seen by a worker process, set by _attach
+_points = None
+_counts = None
+_blocks = []
+
+
+
+def _shared_array(block, shape, dtype):
+    '''
+    returns a numpy array that uses the memory of a shared memory block
+    '''
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+
+def _attach(points_name, counts_name, capacity):
+    '''
+    pool initializer, attaches the worker to the shared points and counts
+    '''
+    global _points, _counts
+    points_block = shared_memory.SharedMemory(name=points_name)
+    counts_block = shared_memory.SharedMemory(name=counts_name)
+
+    # keep the blocks referenced, the arrays are only views on them
+    _blocks[:] = [points_block, counts_block]
+    _points = _shared_array(points_block, (capacity,), complex)
+    _counts = _shared_array(counts_block, (capacity,), np.int64)
+
+
+
+def _count_slice(start, stop, max_iter, shortcuts):
+    '''
+    computes the escape iterations of the shared points start:stop into the shared counts, runs in a worker process
+    '''
+    _counts[start:stop] = escape_counts(_points[start:stop], max_iter, shortcuts)
+
+
+
+class SharedPointPool:
+    '''
+    Worker processes (all cores if None) attached to shared buffers for capacity points and their escape iterations.
+    Write points into pool.points (e.g. with draw_samples(..., out=pool.points[:n])) and compute them with
+    escape_counts. Close the pool, or use it in a with statement, to stop the workers and free the shared memory.
+    '''
+
+    def __init__(self, capacity, workers = None):
+        self.capacity = int(capacity)
+        self.workers = workers if workers is not None else os.cpu_count()
+
+        # shared memory blocks cannot be empty
+        size = max(self.capacity, 1)
+        self._points_block = shared_memory.SharedMemory(create=True, size=size * np.dtype(complex).itemsize)
+        self._counts_block = shared_memory.SharedMemory(create=True, size=size * np.dtype(np.int64).itemsize)
+        self.points = _shared_array(self._points_block, (self.capacity,), complex)
+        self.counts = _shared_array(self._counts_block, (self.capacity,), np.int64)
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_attach,
+                                             initargs=(self._points_block.name, self._counts_block.name, self.capacity))
+
+
+    def escape_counts(self, n, max_iter, shortcuts = False, batch_size = 2 ** 16):
+        '''
+        Computes the escape iterations of the first n points in batches of batch_size on the workers and returns a
+        copy of them.
+        '''
+        if n > self.capacity:
+            raise ValueError(f"the pool holds {self.capacity} points, cannot compute {n}")
+
+        futures = [self._executor.submit(_count_slice, start, min(start + batch_size, n), max_iter, shortcuts)
+                   for start in range(0, n, batch_size)]
+        wait(futures)
+
+        # raise the error of a failed batch
+        for future in futures:
+            future.result()
+
+        return self.counts[:n].copy()
+
+
+    def close(self):
+        '''
+        stops the workers and frees the shared memory. Raises a BufferError if views on pool.points or pool.counts
+        are still in use, they would point to freed memory afterwards.
+        '''
+        # views keep a reference to the array they were taken from, next to the attribute and the getrefcount argument
+        if sys.getrefcount(self.points) > 2 or sys.getrefcount(self.counts) > 2:
+            raise BufferError("views on the shared memory of the pool are still in use, drop or copy them before "
+                                  "closing the pool")
+
+        self._executor.shutdown()
+
+        # the arrays have to be released before the blocks can be closed
+        del self.points, self.counts
+        for block in (self._points_block, self._counts_block):
+            block.close()
+            block.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+
+def shared_running_areas(pool, method, grid, samples, max_iter, rng = None, checkpoints = None, shortcuts = False,
+                         batch_size = 2 ** 16, symmetric = False):
+    '''
+    Draws samples points with method straight into the shared memory of pool, computes them on its workers and returns
+    the running area at every sample or at the checkpoints, like compute_areas.
+    '''
+    total_area = grid[4] * grid[5]
+    draw_samples(method, grid, samples, np.random.default_rng(rng), out=pool.points[:samples])
+    iters = pool.escape_counts(samples, max_iter, shortcuts, batch_size)
+
+    return running_areas(iters, max_iter, total_area, checkpoints, symmetric)
@@ -1,13 +1,13 @@
 '''
 Generates data containing the area of the mandlebrotset obtained with a fixed number of samples and different number of iterations. Simulation can be run 
-a predefined amount of times. Area is determined with four different methods. Data is stored as txt files. 
+a predefined amount of times. Area is determined with four different methods. Data is stored as npy files with a json file holding the parameters. 
 '''
 
 import numpy as np
-import csv
-from itertools import zip_longest
-from functions import compute_areas, setup_grid
-from sampling_methods import random_sampling, lhc_sampling, ortho_sampling, quasi_montecarlo
+from functions import compute_areas, sweep_areas, setup_grid
+from sampling_methods import random_sampling, lhc_sampling, ortho_sampling, quasi_montecarlo, spawn_seeds
+from result_store import save_results
+from escape_cache import EscapeCache, cached_escape_counts
 
 # set parameters of the complex grid
 cmin = -2-1.3j
@@ -16,13 +16,31 @@ cmax = 0.6+1.3j
 # set the parameters of the simulation
 samples =  10 ** 2
 
+# master seed of the simulation, every sampling method gets its own stream derived from it
+seed = 42
+rand_seed, lhc_seed, ortho_seed, qmc_seed, rand_seed_v2 = spawn_seeds(seed, 5)
+rand_rng, lhc_rng, ortho_rng, qmc_rng, rand_rng_v2 = [np.random.default_rng(s) for s in (rand_seed, lhc_seed, ortho_seed, qmc_seed, rand_seed_v2)]
+
 
 # set parameters of the cartesian grid the grid
-xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = setup_grid(cmin, cmax, samples)
+grid = setup_grid(cmin, cmax, samples)
+xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = grid
 
 # compute total area 
 total_area = xrange * yrange
 
+# use the same samples for every max_iter (common random numbers), all max_iters are then computed in a single pass
+common_samples = True
+
+# sample counts at which the running area is stored with common_samples, None stores all of them 
+# (e.g. functions.log_checkpoints(samples, 200))
+checkpoints = None
+
+# folder in which the escape iterations are cached with common_samples, so reruns with the same parameters are not 
+# computed again (None disables the cache)
+cache_directory = 'cache'
+cache = EscapeCache(cache_directory) if cache_directory is not None else None
+
 # -----------------------------------------------------------------------------------------------------------------------------------------------
 # CONVERGENCE FOR DIFFERENT ITERATION INPUTS
 # -----------------------------------------------------------------------------------------------------------------------------------------------
@@ -46,63 +64,71 @@ quasi_samp_areas = []
 final_quasi_areas = []
 
 
-for max_iter in max_iters:
-    print('', end = '\r')
-    print(f"simulating: {int(max_iter/ max_iters[-1]*100)} %", end = '\r')
-    
+if common_samples:
     # random sampling
-    rand_samp_complex_vals = random_sampling(xmin, ymin, xrange, yrange, samples)
-    rand_samp_areas_mandelbrot = compute_areas(rand_samp_complex_vals, max_iter, total_area)
-    final_rand_areas.append(rand_samp_areas_mandelbrot[-1])
-    rand_samp_areas.append(rand_samp_areas_mandelbrot)
-    
+    rand_samp_iters = cached_escape_counts(cache, 'random', rand_seed, grid, samples, max_iters.max(), shortcuts=True)
+    rand_samp_areas = sweep_areas(rand_samp_iters, max_iters, total_area, checkpoints)
+    final_rand_areas = rand_samp_areas[:, -1]
+
     # latin hypercube samling
-    lhc_samp_complex_vals = lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    lhc_samp_areas_mandelbrot = compute_areas(lhc_samp_complex_vals, max_iter, total_area)
-    final_lhc_areas.append(lhc_samp_areas_mandelbrot[-1])
-    lhc_samp_areas.append(lhc_samp_areas_mandelbrot)
+    lhc_samp_iters = cached_escape_counts(cache, 'lhc', lhc_seed, grid, samples, max_iters.max(), shortcuts=True)
+    lhc_samp_areas = sweep_areas(lhc_samp_iters, max_iters, total_area, checkpoints)
+    final_lhc_areas = lhc_samp_areas[:, -1]
 
     # orthogonal sampling 
-    ortho_samp_complex_vals = ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    ortho_samp_areas_mandelbrot = compute_areas(ortho_samp_complex_vals, max_iter, total_area)
-    final_ortho_areas.append(ortho_samp_areas_mandelbrot[-1])
-    ortho_samp_areas.append(ortho_samp_areas_mandelbrot)
-    
+    ortho_samp_iters = cached_escape_counts(cache, 'ortho', ortho_seed, grid, samples, max_iters.max(), shortcuts=True)
+    ortho_samp_areas = sweep_areas(ortho_samp_iters, max_iters, total_area, checkpoints)
+    final_ortho_areas = ortho_samp_areas[:, -1]
+
     # quasi montecarlo sampling
-    quasi_montecarlo_complex_vals = quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    quasi_montecarlo_areas_mandelbrot = compute_areas(quasi_montecarlo_complex_vals, max_iter, total_area)
-    final_quasi_areas.append(quasi_montecarlo_areas_mandelbrot[-1])
-    quasi_samp_areas.append(quasi_montecarlo_areas_mandelbrot)
-
-with open('data/iterconv_rand.csv', 'w', newline='') as myfile:
-    w = csv.writer(myfile)
-    for x, y in zip_longest(max_iters, final_rand_areas):
-        w.writerow([x, y])
-
-with open('data/iterconv_lhc.csv', 'w', newline='') as myfile:
-    w = csv.writer(myfile)
-    for x, y in zip_longest(max_iters, final_lhc_areas):
-        w.writerow([x, y])
-
-with open('data/iterconv_ortho.csv', 'w', newline='') as myfile:
-    w = csv.writer(myfile)
-    for x, y in zip_longest(max_iters, final_ortho_areas):
-        w.writerow([x, y])
-
-with open('data/iterconv_quasi.csv', 'w', newline='') as myfile:
-    w = csv.writer(myfile)
-    for x, y in zip_longest(max_iters, final_quasi_areas):
-        w.writerow([x, y])
-
-random_x = np.asarray(rand_samp_areas)
-lhc_x = np.asarray(lhc_samp_areas)
-ortho_x= np.asarray(ortho_samp_areas)
-qmc_x = np.asarray(quasi_samp_areas)
-
-np.savetxt("data/itsim_random.csv", random_x, delimiter=",")
-np.savetxt("data/itsim_lhc.csv", lhc_x, delimiter=",")
-np.savetxt("data/itsim_orthogonal.csv", ortho_x, delimiter=",")
-np.savetxt("data/itsim_qmc.csv", qmc_x , delimiter=",")
+    quasi_samp_iters = cached_escape_counts(cache, 'qmc', qmc_seed, grid, samples, max_iters.max(), shortcuts=True)
+    quasi_samp_areas = sweep_areas(quasi_samp_iters, max_iters, total_area, checkpoints)
+    final_quasi_areas = quasi_samp_areas[:, -1]
+
+else:
+    for max_iter in max_iters:
+        print('', end = '\r')
+        print(f"simulating: {int(max_iter/ max_iters[-1]*100)} %", end = '\r')
+    
+        # random sampling
+        rand_samp_complex_vals = random_sampling(xmin, ymin, xrange, yrange, samples, rand_rng)
+        rand_samp_areas_mandelbrot = compute_areas(rand_samp_complex_vals, max_iter, total_area, shortcuts=True)
+        final_rand_areas.append(rand_samp_areas_mandelbrot[-1])
+        rand_samp_areas.append(rand_samp_areas_mandelbrot)
+    
+        # latin hypercube samling
+        lhc_samp_complex_vals = lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, lhc_rng)
+        lhc_samp_areas_mandelbrot = compute_areas(lhc_samp_complex_vals, max_iter, total_area, shortcuts=True)
+        final_lhc_areas.append(lhc_samp_areas_mandelbrot[-1])
+        lhc_samp_areas.append(lhc_samp_areas_mandelbrot)
+
+        # orthogonal sampling 
+        ortho_samp_complex_vals = ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, ortho_rng)
+        ortho_samp_areas_mandelbrot = compute_areas(ortho_samp_complex_vals, max_iter, total_area, shortcuts=True)
+        final_ortho_areas.append(ortho_samp_areas_mandelbrot[-1])
+        ortho_samp_areas.append(ortho_samp_areas_mandelbrot)
+    
+        # quasi montecarlo sampling
+        quasi_montecarlo_complex_vals = quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples, qmc_rng)
+        quasi_montecarlo_areas_mandelbrot = compute_areas(quasi_montecarlo_complex_vals, max_iter, total_area, shortcuts=True)
+        final_quasi_areas.append(quasi_montecarlo_areas_mandelbrot[-1])
+        quasi_samp_areas.append(quasi_montecarlo_areas_mandelbrot)
+
+# parameters stored next to the data
+metadata = {'samples': samples, 'max_iters': max_iters, 'seed': seed, 'cmin': cmin, 'cmax': cmax, 
+            'common_samples': common_samples, 'checkpoints': checkpoints if common_samples else None}
+
+# final area per max_iter, stored as (max_iter, area) rows
+save_results('iterconv_rand', np.column_stack([max_iters, final_rand_areas]), dict(metadata, method='random'))
+save_results('iterconv_lhc', np.column_stack([max_iters, final_lhc_areas]), dict(metadata, method='lhc'))
+save_results('iterconv_ortho', np.column_stack([max_iters, final_ortho_areas]), dict(metadata, method='ortho'))
+save_results('iterconv_quasi', np.column_stack([max_iters, final_quasi_areas]), dict(metadata, method='qmc'))
+
+# running area per max_iter
+save_results('itsim_random', np.asarray(rand_samp_areas), dict(metadata, method='random'))
+save_results('itsim_lhc', np.asarray(lhc_samp_areas), dict(metadata, method='lhc'))
+save_results('itsim_orthogonal', np.asarray(ortho_samp_areas), dict(metadata, method='ortho'))
+save_results('itsim_qmc', np.asarray(quasi_samp_areas), dict(metadata, method='qmc'))
 
 
 # -----------------------------------------------------------------------------------------------------------------------------------------------
@@ -118,17 +144,21 @@ total_rand = []
 
 rand_samp_areas_v2 = []
 final_rand_areas_v2 = []
-for max_iter in max_iters:
-    print('', end = '\r')
-    print(f"simulating: {int(max_iter/ max_iters[-1] * 100)} %", end = '\r')
-    # random sampling
-    rand_samp_complex_vals = random_sampling(xmin, ymin, xrange, yrange, samples)
-    rand_samp_areas_mandelbrot = compute_areas(rand_samp_complex_vals, max_iter, total_area)
-    final_rand_areas_v2.append(rand_samp_areas_mandelbrot[-1])
-    rand_samp_areas_v2.append(rand_samp_areas_mandelbrot)
-
-
-random_x = np.asarray(rand_samp_areas_v2)
-np.savetxt("data/total_rand_v01.csv", random_x, delimiter=",")
-
-
+if common_samples:
+    rand_samp_iters_v2 = cached_escape_counts(cache, 'random', rand_seed_v2, grid, samples, max_iters.max(), shortcuts=True)
+    rand_samp_areas_v2 = sweep_areas(rand_samp_iters_v2, max_iters, total_area, checkpoints)
+    final_rand_areas_v2 = rand_samp_areas_v2[:, -1]
+
+else:
+    for max_iter in max_iters:
+        print('', end = '\r')
+        print(f"simulating: {int(max_iter/ max_iters[-1] * 100)} %", end = '\r')
+        # random sampling
+        rand_samp_complex_vals = random_sampling(xmin, ymin, xrange, yrange, samples, rand_rng_v2)
+        rand_samp_areas_mandelbrot = compute_areas(rand_samp_complex_vals, max_iter, total_area, shortcuts=True)
+        final_rand_areas_v2.append(rand_samp_areas_mandelbrot[-1])
+        rand_samp_areas_v2.append(rand_samp_areas_mandelbrot)
+
+metadata = {'method': 'random', 'samples': samples, 'max_iters': max_iters, 'seed': seed, 'cmin': cmin, 'cmax': cmax, 
+            'common_samples': common_samples, 'checkpoints': checkpoints if common_samples else None}
+save_results('total_rand_v01', np.asarray(rand_samp_areas_v2), metadata)
@@ -1,11 +1,13 @@
 '''
 Generates data containing the area of the mandlebrotset obtained with a fixed number of iterations and different number of samples. Simulation can be run 
-a predefined amount of times. Area is determined with four different methods. Data is stored as txt files. 
+a predefined amount of times. Area is determined with four different methods. Data is stored as npy files with a json file holding the parameters. 
 '''
 
-import numpy as np
-from functions import compute_areas, setup_grid
-from sampling_methods import random_sampling, lhc_sampling, ortho_sampling, quasi_montecarlo
+from functions import setup_grid
+from parallel_simulation import run_replicates
+from result_store import save_results, save_metadata
+from escape_cache import EscapeCache
+import instrumentation
 
 
 # set parameters of the complex grid
@@ -16,68 +18,75 @@ cmax = 0.6+1.3j
 samples = 10 ** 2
 max_iter = 100
 
-# set parameters of the cartesian grid the grid
-xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = setup_grid(cmin, cmax, samples)
+# sample counts at which the running area is stored, None stores all of them (e.g. functions.log_checkpoints(samples, 200))
+checkpoints = None
+
+# master seed of the simulation, every replicate and sampling method gets its own stream derived from it
+seed = 42
 
 # -----------------------------------------------------------------------------------------------------------------------------------------------
 # RUN MANDLEBROT SIM WITH DIFFERENT SAMPLING TECHNIQUES
 # -----------------------------------------------------------------------------------------------------------------------------------------------
-data = []
-random_x = []
-lhc_x = []
-ortho_x = []
-qmc_x = []
 sims = 10
 
-for i in range(0, sims):
-    print('', end = '\r')
-    print(f"simulating: {int(i / sims * 100)} %", end = '\r')
-    
-    # save area of mandelbrot
-    total = 0
-    unescaped = 0
-    areas_mandelbrot = []
-    
-    # compute total area 
-    total_area = xrange * yrange
+# amount of worker processes, None uses all cores
+workers = None
+
+# only store the mean, variance, minimum and maximum over the replicates instead of every replicate
+stats_only = False
+
+# folder in which the escape iterations are cached, so reruns with the same parameters are not computed again 
+# (None disables the cache)
+cache_directory = 'cache'
+
+# only sample the upper half of the domain and double the areas, the domain has to be symmetric about the real axis
+symmetric = False
+
+# time the stages and count the kernel work, written to data/instrumentation.json and data/trace.json (chrome trace). 
+# Measurements are kept per process, so the replicates are run in this process (workers = 1) when this is on
+instrument = False
+
+if __name__ == '__main__':
+    if instrument:
+        instrumentation.enable()
+        
+        # worker processes would keep their measurements to themselves
+        if workers != 1:
+            print(f"instrument is on: running the replicates in this process instead of on {workers or 'all'} workers")
+            workers = 1
     
-    # random sampling
-    rand_samp_complex_vals = random_sampling(xmin, ymin, xrange, yrange, samples)
-    rand_samp_areas_mandelbrot = compute_areas(rand_samp_complex_vals, max_iter, total_area)
-    random_x.append(rand_samp_areas_mandelbrot)
+    cache = EscapeCache(cache_directory) if cache_directory is not None else None
+    results = run_replicates(setup_grid(cmin, cmax, samples, symmetric), samples, max_iter, sims, seed, workers=workers, 
+                             checkpoints=checkpoints, stats_only=stats_only, cache=cache, symmetric=symmetric)
     
-    # latin hypercube samling
-    lhc_samp_complex_vals = lhc_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    lhc_samp_areas_mandelbrot = compute_areas(lhc_samp_complex_vals, max_iter, total_area)
-    lhc_x.append(lhc_samp_areas_mandelbrot)
+    # the parameters of the simulation, stored in a json sidecar next to the data
+    metadata = {'samples': samples, 'max_iter': max_iter, 'sims': sims, 'seed': seed, 'cmin': cmin, 'cmax': cmax, 
+                'checkpoints': checkpoints, 'symmetric': symmetric}
     
-    # orthogonal sampling 
-    ortho_samp_complex_vals = ortho_sampling(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    ortho_samp_areas_mandelbrot = compute_areas(ortho_samp_complex_vals, max_iter, total_area)
-    ortho_x.append(ortho_samp_areas_mandelbrot)
+    if stats_only:
+        # save the aggregates in npz files
+        results['random'].save("data/samplesim_random_stats.npz")
+        results['lhc'].save("data/samplesim_lhc_stats.npz")
+        results['ortho'].save("data/samplesim_orthogonal_stats.npz")
+        results['qmc'].save("data/samplesim_qmc_stats.npz")
+        save_metadata('samplesim_random_stats', dict(metadata, method='random'))
+        save_metadata('samplesim_lhc_stats', dict(metadata, method='lhc'))
+        save_metadata('samplesim_orthogonal_stats', dict(metadata, method='ortho'))
+        save_metadata('samplesim_qmc_stats', dict(metadata, method='qmc'))
     
-    # quasi montecarlo sampling
-    quasi_montecarlo_complex_vals = quasi_montecarlo(xmin, ymin, xmax, ymax, xrange, yrange, xdim, ydim, delta, samples)
-    quasi_montecarlo_areas_mandelbrot = compute_areas(quasi_montecarlo_complex_vals, max_iter, total_area)
-    qmc_x.append(quasi_montecarlo_areas_mandelbrot)
- 
-# -----------------------------------------------------------------------------------------------------------------------------------------------
-# STORE DATA OF SIMS IN TXT FILES
-# -----------------------------------------------------------------------------------------------------------------------------------------------
+    else:
+        # save data in npy files
+        save_results('samplesim_random', results['random'], dict(metadata, method='random'))
+        save_results('samplesim_lhc', results['lhc'], dict(metadata, method='lhc'))
+        save_results('samplesim_orthogonal', results['ortho'], dict(metadata, method='ortho'))
+        save_results('samplesim_qmc', results['qmc'], dict(metadata, method='qmc'))
 
-# save data
-random_x = np.asarray(random_x)
-lhc_x = np.asarray(lhc_x)
-ortho_x= np.asarray(ortho_x)
-qmc_x = np.asarray(qmc_x)
-    
-np.savetxt("data/samplesim_random.csv", random_x, delimiter=",")
-np.savetxt("data/samplesim_lhc.csv", lhc_x, delimiter=",")
-np.savetxt("data/samplesim_orthogonal.csv", ortho_x, delimiter=",")
-np.savetxt("data/samplesim_qmc.csv", qmc_x , delimiter=",")
+    if instrument:
+        instrumentation.export_json('data/instrumentation.json')
+        instrumentation.export_trace('data/trace.json')
 
-print('')
-print('finished simulating')
+    print('')
+    print('finished simulating')
 
 
 
@@ -0,0 +1,173 @@
+'''
+Renders the mandelbrot set tile by tile into a memory mapped image on disk, so the resolution is not limited by the
+available memory. Tiles are rendered on a pool of worker processes and every worker writes its tile directly into the
+image. Finished tiles are recorded, so an interrupted render continues where it stopped. The image can be written to
+a png file row by row.
+'''
+
+import os
+import json
+import zlib
+import struct
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functions import setup_grid, color_palette, render_tile
+
+
+# palettes built in this process, so every worker builds the palette of a max_iter only once instead of per tile
+_palettes = {}
+
+
+
+def _palette(max_iter):
+    '''
+    returns the color_palette of max_iter, built on the first call in a process
+    '''
+    if max_iter not in _palettes:
+        _palettes[max_iter] = color_palette(max_iter)
+
+    return _palettes[max_iter]
+
+
+
+def _tile_ranges(ydim, xdim, tile_size):
+    '''
+    returns the (row range, column range) of every tile, row by row
+    '''
+    return [(range(i, min(i + tile_size, ydim)), range(j, min(j + tile_size, xdim)))
+            for i in range(0, ydim, tile_size) for j in range(0, xdim, tile_size)]
+
+
+
+def _render_tile_to_image(image_path, xmin, ymin, delta, rows, columns, max_iter, smooth):
+    '''
+    renders one tile and writes it into the memory mapped image, runs in a worker process
+    '''
+    image = np.load(image_path, mmap_mode='r+')
+    image[rows.start:rows.stop, columns.start:columns.stop] = render_tile(xmin, ymin, delta, rows, columns, max_iter,
+                                                                         _palette(max_iter), smooth)
+    image.flush()
+    del image
+
+
+
+def render_tiled(cmin, cmax, max_iter, samples, image_path, tile_size = 512, workers = None, smooth = False):
+    '''
+    Renders the mandelbrot set on the grid of setup_grid(cmin, cmax, samples) into image_path, a .npy file with a
+    (ydim, xdim, 3) uint8 image that is memory mapped. Tiles of tile_size by tile_size pixels are rendered on workers
+    processes (all cores if None, in this process if 1). Finished tiles are recorded in image_path + '.tiles.npy';
+    when the render is started again with the same parameters only the missing tiles are rendered. Returns the
+    memory mapped image.
+    '''
+    xmin, xmax, ymin, ymax, xrange, yrange, xdim, ydim, delta = setup_grid(cmin, cmax, samples)
+    tiles = _tile_ranges(ydim, xdim, tile_size)
+
+    progress_path = image_path + '.tiles.npy'
+    parameters_path = image_path + '.json'
+
+    # plain python types, numpy scalars cannot be written to json
+    cmin, cmax = complex(cmin), complex(cmax)
+    parameters = {'cmin': [cmin.real, cmin.imag], 'cmax': [cmax.real, cmax.imag], 'max_iter': int(max_iter),
+                  'samples': int(samples), 'tile_size': int(tile_size), 'smooth': bool(smooth)}
+
+    # continue an earlier render if there is one with the same parameters
+    if os.path.exists(image_path) and os.path.exists(progress_path) and os.path.exists(parameters_path):
+        with open(parameters_path) as myfile:
+            if json.load(myfile) != parameters:
+                raise ValueError(f"{image_path} was rendered with other parameters, remove it or choose another path")
+        finished = np.load(progress_path, mmap_mode='r+')
+
+    else:
+        np.lib.format.open_memmap(image_path, mode='w+', dtype=np.uint8, shape=(ydim, xdim, 3))
+        finished = np.lib.format.open_memmap(progress_path, mode='w+', dtype=bool, shape=(len(tiles),))
+
+        # written atomically, through a temporary file, so a broken write cannot block later resumes
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(parameters_path)), suffix='.tmp')
+        with os.fdopen(handle, 'w') as myfile:
+            json.dump(parameters, myfile)
+        os.replace(temp_path, parameters_path)
+
+    todo = [index for index in range(len(tiles)) if not finished[index]]
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers == 1:
+        for done, index in enumerate(todo):
+            print(f"rendering: {int(done / len(todo) * 100)} %", end = '\r')
+            rows, columns = tiles[index]
+            _render_tile_to_image(image_path, xmin, ymin, delta, rows, columns, max_iter, smooth)
+            finished[index] = True
+            finished.flush()
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_render_tile_to_image, image_path, xmin, ymin, delta, *tiles[index], max_iter, smooth): index
+                       for index in todo}
+
+            for done, future in enumerate(as_completed(futures)):
+                print(f"rendering: {int(done / len(todo) * 100)} %", end = '\r')
+                future.result()
+
+                # a tile is only marked when its pixels are on disk
+                finished[futures[future]] = True
+                finished.flush()
+
+    return np.load(image_path, mmap_mode='r')
+
+
+
+def _png_chunk(myfile, kind, data):
+    '''
+    writes one png chunk: length, type, data and checksum
+    '''
+    myfile.write(struct.pack('>I', len(data)))
+    myfile.write(kind)
+    myfile.write(data)
+    myfile.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+
+def write_png(image, png_path, rows_per_chunk = 256, compression = 6):
+    '''
+    Writes a (height, width, 3) uint8 image (e.g. a memory mapped one) to an 8-bit RGB png file. The image is read
+    and compressed rows_per_chunk rows at a time, so it never has to fit in memory.
+    '''
+    height, width, _ = image.shape
+    compressor = zlib.compressobj(compression)
+
+    with open(png_path, 'wb') as myfile:
+        myfile.write(b'\x89PNG\r\n\x1a\n')
+        _png_chunk(myfile, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+        for first in range(0, height, rows_per_chunk):
+            rows = np.asarray(image[first:first + rows_per_chunk], dtype=np.uint8)
+
+            # every row starts with filter type 0 (none)
+            scanlines = np.zeros((rows.shape[0], 1 + 3 * width), dtype=np.uint8)
+            scanlines[:, 1:] = rows.reshape(rows.shape[0], -1)
+
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                _png_chunk(myfile, b'IDAT', data)
+
+        _png_chunk(myfile, b'IDAT', compressor.flush())
+        _png_chunk(myfile, b'IEND', b'')
+
+
+
+if __name__ == '__main__':
+    # set parameters of the complex grid
+    cmin = -2-1.3j
+    cmax = 0.6+1.3j
+
+    # set the parameters of the render
+    samples = 8192
+    max_iter = 200
+
+    image = render_tiled(cmin, cmax, max_iter, samples, 'data/mandelbrot_tiled.npy')
+    write_png(image, 'data/mandelbrot_tiled.png')
+
+    print('')
+    print('finished rendering')